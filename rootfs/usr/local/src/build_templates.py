@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Template pre-compiler for Sengled Local Server
+Compiles Jinja2 templates to Python modules at image build time so
+config_manager can load them without parsing template source on boot
+"""
+import argparse
+import logging
+
+from jinja2 import Environment, FileSystemLoader
+
+logger = logging.getLogger(__name__)
+
+
+def compile_templates(template_dir: str, output_dir: str) -> bool:
+    """
+    Compile all .j2 templates in a directory to importable Python modules
+    
+    Args:
+        template_dir: Directory containing the Jinja2 templates
+        output_dir: Directory where compiled modules will be written
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        env = Environment(loader=FileSystemLoader(template_dir))
+        env.compile_templates(output_dir, extensions=["j2"], zip=None, ignore_errors=False)
+        logger.info(f"Compiled templates from {template_dir} into {output_dir}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to compile templates: {e}")
+        return False
+
+
+def main():
+    """Main entry point for template pre-compilation"""
+    parser = argparse.ArgumentParser(description='Pre-compile Jinja2 templates')
+    parser.add_argument('--template-dir', required=True, help='Template source directory')
+    parser.add_argument('--output-dir', required=True, help='Compiled template output directory')
+    
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    return 0 if compile_templates(args.template_dir, args.output_dir) else 1
+
+
+if __name__ == '__main__':
+    exit(main())
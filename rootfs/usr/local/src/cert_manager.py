@@ -5,25 +5,159 @@ Generates and manages CA and server certificates for MQTT SSL
 """
 import os
 import argparse
+import hashlib
+import ipaddress
 import json
 import logging
-from datetime import datetime, timedelta
+import re
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
 from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
 
 logger = logging.getLogger(__name__)
 
+# Characters an IPv4/IPv6 literal can contain; anything else is a DNS name
+_IP_CHARS = re.compile(r'^[0-9a-fA-F:.]+$')
+
+# Supported private key algorithms (RSA stays the default for legacy bulb firmware)
+KEY_ALGORITHMS = ("rsa", "ecdsa", "ed25519")
+
+# Public key type produced by each key algorithm
+_PUBLIC_KEY_TYPES = {
+    "rsa": rsa.RSAPublicKey,
+    "ecdsa": ec.EllipticCurvePublicKey,
+    "ed25519": ed25519.Ed25519PublicKey,
+}
+
+# Subject Alternative Names used by full-mode server certificates when none are given
+DEFAULT_SAN_LIST = ["localhost", "sengled.local", "127.0.0.1", "::1"]
+
+
+def _generate_private_key(key_algorithm: str = "rsa"):
+    """Generate a private key for the requested algorithm"""
+    if key_algorithm == "ed25519":
+        return ed25519.Ed25519PrivateKey.generate()
+    
+    if key_algorithm == "ecdsa":
+        # P-256 is the most widely supported curve, including older TLS stacks
+        return ec.generate_private_key(ec.SECP256R1())
+    
+    return rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=2048
+    )
+
+
+def _private_key_pem(private_key) -> bytes:
+    """Serialize a private key as unencrypted PKCS#8 PEM"""
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+
+def _generate_private_key_pem(key_algorithm: str = "rsa") -> bytes:
+    """Generate a private key in a worker process, returned as PEM so it pickles cleanly"""
+    return _private_key_pem(_generate_private_key(key_algorithm))
+
+
+@lru_cache(maxsize=4)
+def _parse_cert(path: str, mtime_ns: int) -> x509.Certificate:
+    """Parse a PEM certificate; the mtime in the cache key retires stale entries"""
+    with open(path, "rb") as f:
+        return x509.load_pem_x509_certificate(f.read())
+
+
+def _load_cert(path: Path) -> x509.Certificate:
+    """Load a certificate, reusing the parsed object while the file is unchanged"""
+    return _parse_cert(str(path), path.stat().st_mtime_ns)
+
+
+def _secure_write(path: Path, data: bytes, mode: int):
+    """
+    Atomically replace a file, with its final permissions set before any data lands
+    
+    Data goes to a temp file that is fsynced and renamed over the target, so a
+    crash never leaves a truncated key or certificate behind.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # The open() mode is masked by umask and ignored for existing files, so pin it
+            os.fchmod(fd, mode)
+            if path.exists() and os.geteuid() == 0:
+                # Keep the owner (e.g. mosquitto) of the file being replaced;
+                # only root can change it, and only when it differs
+                st = path.stat()
+                tmp_st = os.fstat(fd)
+                if (st.st_uid, st.st_gid) != (tmp_st.st_uid, tmp_st.st_gid):
+                    os.fchown(fd, st.st_uid, st.st_gid)
+            f.write(data)
+            f.flush()
+            os.fsync(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Don't leave a half-written temp file in the certs directory
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _san_entry(san: str):
+    """x509 GeneralName for a SAN string: an IP address if it parses as one, else a DNS name"""
+    if _IP_CHARS.match(san):
+        try:
+            return x509.IPAddress(ipaddress.ip_address(san))
+        except ValueError:
+            # Hex-only hostnames (e.g. "cafe") pass the prefilter
+            pass
+    return x509.DNSName(san)
+
+
+def _not_after_utc(cert: x509.Certificate) -> datetime:
+    """Certificate expiry as an aware UTC datetime"""
+    return cert.not_valid_after.replace(tzinfo=timezone.utc)
+
+
+def _random_serial() -> int:
+    """Random positive serial number of at most 159 bits (RFC 5280 allows 20 octets)"""
+    # Setting the low bit guarantees a non-zero serial
+    return secrets.randbits(159) | 1
+
+
+def _signature_hash(private_key):
+    """Return the digest to sign with (EdDSA signs without a separate hash)"""
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return None
+    return hashes.SHA256()
+
 
 class CertificateManager:
     """Manages SSL certificates for the MQTT broker"""
     
-    def __init__(self, output_dir: str):
+    # Parsed CA key/cert per certificate directory, tagged with the files' mtimes
+    _ca_cache = {}
+    
+    # Existing certificates are reused until this close to expiry
+    RENEWAL_WINDOW = timedelta(days=30)
+    
+    def __init__(self, output_dir: str, key_algorithm: str = "rsa"):
+        if key_algorithm not in KEY_ALGORITHMS:
+            raise ValueError(f"Unsupported key algorithm: {key_algorithm}")
+        
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.key_algorithm = key_algorithm
         
         # Certificate file paths
         self.ca_key_path = self.output_dir / "ca.key"
@@ -31,27 +165,76 @@ class CertificateManager:
         self.server_key_path = self.output_dir / "server.key"
         self.server_cert_path = self.output_dir / "server.crt"
         
+        # Records the settings and expiry of the last generated chain
+        self.stamp_path = self.output_dir / ".stamp"
+        
+    def _ca_stamp(self) -> tuple:
+        """Modification times identifying the CA key/cert currently on disk"""
+        return (os.stat(self.ca_key_path).st_mtime_ns,
+                os.stat(self.ca_cert_path).st_mtime_ns)
+    
+    def _load_ca(self) -> tuple:
+        """Load the CA private key and certificate, reusing parsed objects while unchanged"""
+        stamp = self._ca_stamp()
+        cached = self._ca_cache.get(str(self.output_dir))
+        if cached is not None and cached[0] == stamp:
+            return cached[1], cached[2]
+        
+        with open(self.ca_key_path, "rb") as f:
+            ca_private_key = serialization.load_pem_private_key(
+                f.read(),
+                password=None
+            )
+        ca_certificate = _load_cert(self.ca_cert_path)
+        
+        self._ca_cache[str(self.output_dir)] = (stamp, ca_private_key, ca_certificate)
+        return ca_private_key, ca_certificate
+    
+    def _generate_key_pair(self) -> tuple:
+        """Generate the CA and server private keys, in parallel when it pays off"""
+        if self.key_algorithm != "rsa":
+            # Non-RSA keygen is faster than spawning worker processes
+            return (_generate_private_key(self.key_algorithm),
+                    _generate_private_key(self.key_algorithm))
+        
+        logger.info("Generating CA and server private keys in parallel...")
+        try:
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    executor.submit(_generate_private_key_pem, self.key_algorithm)
+                    for _ in range(2)
+                ]
+                return tuple(
+                    serialization.load_pem_private_key(
+                        future.result(),
+                        password=None
+                    )
+                    for future in futures
+                )
+        except Exception as e:
+            logger.warning(f"Parallel key generation unavailable ({e}), generating serially")
+            return (_generate_private_key(self.key_algorithm),
+                    _generate_private_key(self.key_algorithm))
+    
     def generate_ca_certificate(self, common_name: str = "Sengled Local CA", 
-                               validity_days: int = 3650) -> bool:
+                               validity_days: int = 3650, private_key=None) -> bool:
         """
         Generate Certificate Authority (CA) certificate
         
         Args:
             common_name: Common name for the CA certificate
             validity_days: Certificate validity period in days
+            private_key: Pre-generated CA private key (generated if None)
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            logger.info("Generating CA private key...")
-            
-            # Generate CA private key
-            ca_private_key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048,
-                backend=default_backend()
-            )
+            # Generate CA private key unless one was supplied
+            ca_private_key = private_key
+            if ca_private_key is None:
+                logger.info(f"Generating CA private key ({self.key_algorithm})...")
+                ca_private_key = _generate_private_key(self.key_algorithm)
             
             # Create CA certificate
             logger.info(f"Creating CA certificate: {common_name}")
@@ -65,6 +248,7 @@ class CertificateManager:
                 x509.NameAttribute(NameOID.COMMON_NAME, common_name),
             ])
             
+            now = datetime.now(timezone.utc)
             ca_certificate = x509.CertificateBuilder().subject_name(
                 subject
             ).issuer_name(
@@ -72,11 +256,11 @@ class CertificateManager:
             ).public_key(
                 ca_private_key.public_key()
             ).serial_number(
-                x509.random_serial_number()
+                _random_serial()
             ).not_valid_before(
-                datetime.utcnow()
+                now
             ).not_valid_after(
-                datetime.utcnow() + timedelta(days=validity_days)
+                now + timedelta(days=validity_days)
             ).add_extension(
                 x509.SubjectKeyIdentifier.from_public_key(ca_private_key.public_key()),
                 critical=False,
@@ -99,23 +283,15 @@ class CertificateManager:
                     decipher_only=False
                 ),
                 critical=True,
-            ).sign(ca_private_key, hashes.SHA256(), default_backend())
-            
-            # Save CA private key
-            with open(self.ca_key_path, "wb") as f:
-                f.write(ca_private_key.private_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PrivateFormat.PKCS8,
-                    encryption_algorithm=serialization.NoEncryption()
-                ))
+            ).sign(ca_private_key, _signature_hash(ca_private_key))
             
-            # Save CA certificate
-            with open(self.ca_cert_path, "wb") as f:
-                f.write(ca_certificate.public_bytes(serialization.Encoding.PEM))
+            # Save CA private key and certificate with secure permissions
+            _secure_write(self.ca_key_path, _private_key_pem(ca_private_key), 0o600)
+            _secure_write(self.ca_cert_path,
+                          ca_certificate.public_bytes(serialization.Encoding.PEM), 0o644)
             
-            # Set secure permissions
-            os.chmod(self.ca_key_path, 0o600)
-            os.chmod(self.ca_cert_path, 0o644)
+            # Remember the freshly written CA so signing doesn't re-parse the PEM files
+            self._ca_cache[str(self.output_dir)] = (self._ca_stamp(), ca_private_key, ca_certificate)
             
             logger.info(f"CA certificate generated successfully: {self.ca_cert_path}")
             return True
@@ -126,7 +302,7 @@ class CertificateManager:
     
     def generate_server_certificate(self, common_name: str = "sengled.local",
                                    san_list: list = None, validity_days: int = 365,
-                                   simple_mode: bool = False) -> bool:
+                                   simple_mode: bool = False, private_key=None) -> bool:
         """
         Generate server certificate signed by the CA
         
@@ -134,6 +310,7 @@ class CertificateManager:
             common_name: Common name for the server certificate
             san_list: List of Subject Alternative Names (IPs, hostnames)
             validity_days: Certificate validity period in days
+            private_key: Pre-generated server private key (generated if None)
             
         Returns:
             bool: True if successful, False otherwise
@@ -145,30 +322,13 @@ class CertificateManager:
                 return False
             
             logger.info("Loading CA certificate and key...")
+            ca_private_key, ca_certificate = self._load_ca()
             
-            # Load CA private key
-            with open(self.ca_key_path, "rb") as f:
-                ca_private_key = serialization.load_pem_private_key(
-                    f.read(),
-                    password=None,
-                    backend=default_backend()
-                )
-            
-            # Load CA certificate
-            with open(self.ca_cert_path, "rb") as f:
-                ca_certificate = x509.load_pem_x509_certificate(
-                    f.read(),
-                    default_backend()
-                )
-            
-            logger.info("Generating server private key...")
-            
-            # Generate server private key
-            server_private_key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048,
-                backend=default_backend()
-            )
+            # Generate server private key unless one was supplied
+            server_private_key = private_key
+            if server_private_key is None:
+                logger.info(f"Generating server private key ({self.key_algorithm})...")
+                server_private_key = _generate_private_key(self.key_algorithm)
             
             # Create server certificate
             logger.info(f"Creating server certificate: {common_name}")
@@ -183,6 +343,7 @@ class CertificateManager:
             ])
             
             # Build certificate
+            now = datetime.now(timezone.utc)
             cert_builder = x509.CertificateBuilder().subject_name(
                 subject
             ).issuer_name(
@@ -190,11 +351,11 @@ class CertificateManager:
             ).public_key(
                 server_private_key.public_key()
             ).serial_number(
-                x509.random_serial_number()
+                _random_serial()
             ).not_valid_before(
-                datetime.utcnow()
+                now
             ).not_valid_after(
-                datetime.utcnow() + timedelta(days=validity_days)
+                now + timedelta(days=validity_days)
             ).add_extension(
                 x509.SubjectKeyIdentifier.from_public_key(server_private_key.public_key()),
                 critical=False,
@@ -215,7 +376,8 @@ class CertificateManager:
                         key_cert_sign=False,
                         crl_sign=False,
                         digital_signature=True,
-                        key_encipherment=True,
+                        # Key encipherment only applies to RSA key exchange
+                        key_encipherment=isinstance(server_private_key, rsa.RSAPrivateKey),
                         key_agreement=False,
                         data_encipherment=False,
                         content_commitment=False,
@@ -232,24 +394,10 @@ class CertificateManager:
                 
                 # Add Subject Alternative Names
                 if san_list is None:
-                    san_list = [
-                        "localhost",
-                        "sengled.local",
-                        "127.0.0.1",
-                        "::1"
-                    ]
+                    san_list = DEFAULT_SAN_LIST
                 
                 # Convert SAN list to x509 objects
-                san_objects = []
-                for san in san_list:
-                    try:
-                        # Try to parse as IP address
-                        import ipaddress
-                        ip = ipaddress.ip_address(san)
-                        san_objects.append(x509.IPAddress(ip))
-                    except ValueError:
-                        # Treat as DNS name
-                        san_objects.append(x509.DNSName(san))
+                san_objects = [_san_entry(san) for san in san_list]
                 
                 if san_objects:
                     cert_builder = cert_builder.add_extension(
@@ -262,24 +410,13 @@ class CertificateManager:
             
             # Sign the certificate
             server_certificate = cert_builder.sign(
-                ca_private_key, hashes.SHA256(), default_backend()
+                ca_private_key, _signature_hash(ca_private_key)
             )
             
-            # Save server private key
-            with open(self.server_key_path, "wb") as f:
-                f.write(server_private_key.private_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PrivateFormat.PKCS8,
-                    encryption_algorithm=serialization.NoEncryption()
-                ))
-            
-            # Save server certificate
-            with open(self.server_cert_path, "wb") as f:
-                f.write(server_certificate.public_bytes(serialization.Encoding.PEM))
-            
-            # Set secure permissions
-            os.chmod(self.server_key_path, 0o600)
-            os.chmod(self.server_cert_path, 0o644)
+            # Save server private key and certificate with secure permissions
+            _secure_write(self.server_key_path, _private_key_pem(server_private_key), 0o600)
+            _secure_write(self.server_cert_path,
+                          server_certificate.public_bytes(serialization.Encoding.PEM), 0o644)
             
             logger.info(f"Server certificate generated successfully: {self.server_cert_path}")
             return True
@@ -310,30 +447,28 @@ class CertificateManager:
         
         try:
             if self.ca_cert_path.exists():
-                with open(self.ca_cert_path, "rb") as f:
-                    ca_cert = x509.load_pem_x509_certificate(f.read(), default_backend())
-                    info["ca_subject"] = ca_cert.subject.rfc4514_string()
-                    info["ca_not_after"] = ca_cert.not_valid_after.isoformat()
-                    info["ca_serial"] = str(ca_cert.serial_number)
+                ca_cert = _load_cert(self.ca_cert_path)
+                info["ca_subject"] = ca_cert.subject.rfc4514_string()
+                info["ca_not_after"] = ca_cert.not_valid_after.isoformat()
+                info["ca_serial"] = str(ca_cert.serial_number)
             
             if self.server_cert_path.exists():
-                with open(self.server_cert_path, "rb") as f:
-                    server_cert = x509.load_pem_x509_certificate(f.read(), default_backend())
-                    info["server_subject"] = server_cert.subject.rfc4514_string()
-                    info["server_not_after"] = server_cert.not_valid_after.isoformat()
-                    info["server_serial"] = str(server_cert.serial_number)
-                    
-                    # Extract SAN information
-                    try:
-                        san_ext = server_cert.extensions.get_extension_for_oid(
-                            x509.oid.ExtensionOID.SUBJECT_ALTERNATIVE_NAME
-                        )
-                        san_names = []
-                        for name in san_ext.value:
-                            san_names.append(str(name))
-                        info["server_san"] = san_names
-                    except x509.ExtensionNotFound:
-                        info["server_san"] = []
+                server_cert = _load_cert(self.server_cert_path)
+                info["server_subject"] = server_cert.subject.rfc4514_string()
+                info["server_not_after"] = server_cert.not_valid_after.isoformat()
+                info["server_serial"] = str(server_cert.serial_number)
+                
+                # Extract SAN information
+                try:
+                    san_ext = server_cert.extensions.get_extension_for_oid(
+                        x509.oid.ExtensionOID.SUBJECT_ALTERNATIVE_NAME
+                    )
+                    san_names = []
+                    for name in san_ext.value:
+                        san_names.append(str(name))
+                    info["server_san"] = san_names
+                except x509.ExtensionNotFound:
+                    info["server_san"] = []
         
         except Exception as e:
             logger.error(f"Failed to read certificate info: {e}")
@@ -341,30 +476,175 @@ class CertificateManager:
         
         return info
     
+    def _settings_fingerprint(self, common_name: str, san_list: list, simple_mode: bool) -> str:
+        """Hash of the settings that shape the generated certificates"""
+        settings = [common_name, sorted(san_list or []), simple_mode, self.key_algorithm]
+        return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+    
+    def _server_cert_sha256(self) -> str:
+        """SHA-256 of the server certificate file, tying a stamp to the cert it describes"""
+        return hashlib.sha256(self.server_cert_path.read_bytes()).hexdigest()
+    
+    def _read_stamp(self):
+        """The stamp for the server certificate on disk, or None if missing, unreadable or stale"""
+        try:
+            stamp = json.loads(self.stamp_path.read_bytes())
+            if stamp["server_cert_sha256"] != self._server_cert_sha256():
+                logger.info("Certificate stamp doesn't match server.crt, re-checking the certificate")
+                return None
+            datetime.fromisoformat(stamp["server_not_after"])
+            return stamp
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable certificate stamp: {e}")
+            return None
+    
+    def _server_cert_matches(self, common_name: str, san_list: list, simple_mode: bool) -> bool:
+        """Check the server certificate's common name, key type and SANs against the settings"""
+        cert = _load_cert(self.server_cert_path)
+        
+        cn = cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+        if not cn or cn[0].value != common_name:
+            logger.info("Server certificate common name differs from settings")
+            return False
+        
+        if not isinstance(cert.public_key(), _PUBLIC_KEY_TYPES[self.key_algorithm]):
+            logger.info("Server certificate key algorithm differs from settings")
+            return False
+        
+        # Simple-mode certificates carry no SAN extension
+        expected = set() if simple_mode else {_san_entry(san) for san in (san_list or DEFAULT_SAN_LIST)}
+        try:
+            actual = set(cert.extensions.get_extension_for_oid(
+                x509.oid.ExtensionOID.SUBJECT_ALTERNATIVE_NAME
+            ).value)
+        except x509.ExtensionNotFound:
+            actual = set()
+        if actual != expected:
+            logger.info("Server certificate SANs differ from settings")
+            return False
+        
+        return True
+    
+    def _existing_certificates_valid(self, fingerprint: str, common_name: str,
+                                     san_list: list, simple_mode: bool) -> bool:
+        """Check whether the existing certificates match the settings and aren't near expiry
+        
+        The stamp lets later runs skip parsing the certificate; without a stamp
+        that matches server.crt, the certificate itself is checked and stamped.
+        """
+        if not self.certificates_exist():
+            return False
+        
+        stamp = self._read_stamp()
+        if stamp is not None:
+            if stamp.get("fingerprint") != fingerprint:
+                logger.info("Certificate settings changed, regenerating")
+                return False
+            not_after = datetime.fromisoformat(stamp["server_not_after"])
+        else:
+            try:
+                if not self._server_cert_matches(common_name, san_list, simple_mode):
+                    return False
+                not_after = _not_after_utc(_load_cert(self.server_cert_path))
+            except Exception as e:
+                logger.warning(f"Unable to read existing server certificate: {e}")
+                return False
+        
+        remaining = not_after - datetime.now(timezone.utc)
+        if remaining <= self.RENEWAL_WINDOW:
+            logger.info(f"Server certificate expires in {remaining.days} days, regenerating")
+            return False
+        
+        if stamp is None:
+            try:
+                self._write_stamp(fingerprint)
+            except Exception as e:
+                logger.warning(f"Failed to write certificate stamp: {e}")
+        
+        logger.info(f"Existing certificates valid for another {remaining.days} days")
+        return True
+    
+    def _ca_reusable(self) -> bool:
+        """Check whether the existing CA can keep signing (same key type, not near expiry)"""
+        if not self.ca_key_path.exists() or not self.ca_cert_path.exists():
+            return False
+        try:
+            _, ca_certificate = self._load_ca()
+        except Exception as e:
+            logger.warning(f"Unable to load existing CA, regenerating it: {e}")
+            return False
+        
+        if not isinstance(ca_certificate.public_key(), _PUBLIC_KEY_TYPES[self.key_algorithm]):
+            logger.info("CA key algorithm differs from settings, regenerating the CA")
+            return False
+        if _not_after_utc(ca_certificate) - datetime.now(timezone.utc) <= self.RENEWAL_WINDOW:
+            logger.info("CA certificate is near expiry, regenerating the CA")
+            return False
+        return True
+    
+    def _write_stamp(self, fingerprint: str):
+        """Record the settings and expiry of the server certificate on disk"""
+        server_cert = _load_cert(self.server_cert_path)
+        
+        stamp = {
+            "fingerprint": fingerprint,
+            "server_not_after": _not_after_utc(server_cert).isoformat(),
+            "server_cert_sha256": self._server_cert_sha256()
+        }
+        _secure_write(self.stamp_path, json.dumps(stamp).encode(), 0o644)
+    
     def generate_all_certificates(self, common_name: str = "sengled.local", 
-                                san_list: list = None, simple_mode: bool = True) -> bool:
+                                san_list: list = None, simple_mode: bool = True,
+                                force: bool = False) -> bool:
         """
         Generate complete certificate chain (CA + server)
         
+        Existing certificates are kept when they match the settings and the
+        server certificate isn't close to expiry. When only the server
+        certificate needs replacing, a still-valid CA is kept so clients that
+        trust it don't have to be updated.
+        
         Args:
             common_name: Common name for server certificate
             san_list: Subject Alternative Names for server certificate
             simple_mode: Use simple certificates for legacy client compatibility (default True for Sengled)
+            force: Regenerate even if valid certificates already exist
             
         Returns:
             bool: True if successful, False otherwise
         """
-        logger.info("Starting complete certificate generation...")
+        fingerprint = self._settings_fingerprint(common_name, san_list, simple_mode)
+        if not force and self._existing_certificates_valid(fingerprint, common_name, san_list, simple_mode):
+            return True
+        
         logger.info(f"Certificate mode: {'Simple (legacy compatible)' if simple_mode else 'Full (modern)'}")
         
-        # Generate CA certificate
-        if not self.generate_ca_certificate():
-            return False
+        if not force and self._ca_reusable():
+            logger.info("Keeping existing CA, generating a new server certificate...")
+            server_private_key = None
+        else:
+            logger.info("Starting complete certificate generation...")
+            
+            # Both keys are independent, so generate them up front (in parallel for RSA)
+            ca_private_key, server_private_key = self._generate_key_pair()
+            
+            # Generate CA certificate
+            if not self.generate_ca_certificate(private_key=ca_private_key):
+                return False
         
         # Generate server certificate
-        if not self.generate_server_certificate(common_name, san_list, simple_mode=simple_mode):
+        if not self.generate_server_certificate(common_name, san_list, simple_mode=simple_mode,
+                                                private_key=server_private_key):
             return False
         
+        try:
+            self._write_stamp(fingerprint)
+        except Exception as e:
+            # Certificates are usable; they'll just be regenerated on the next run
+            logger.warning(f"Failed to write certificate stamp: {e}")
+        
         logger.info("All certificates generated successfully!")
         return True
 
@@ -372,13 +652,17 @@ class CertificateManager:
 def main():
     """Main entry point for certificate management"""
     parser = argparse.ArgumentParser(description='Manage SSL certificates for Sengled Local Server')
-    parser.add_argument('--generate', action='store_true', help='Generate new certificates')
+    parser.add_argument('--generate', action='store_true', help='Generate certificates if missing, outdated, or near expiry')
+    parser.add_argument('--force', action='store_true', help='With --generate, regenerate even if certificates are valid')
     parser.add_argument('--info', action='store_true', help='Show certificate information')
     parser.add_argument('--output-dir', required=True, help='Output directory for certificates')
     parser.add_argument('--common-name', default='sengled.local', help='Common name for server certificate')
     parser.add_argument('--san', action='append', help='Subject Alternative Name (can be used multiple times)')
     parser.add_argument('--simple', action='store_true', default=True, help='Generate simple certificates for legacy compatibility (default)')
     parser.add_argument('--full', action='store_true', help='Generate full certificates with all extensions')
+    parser.add_argument('--key-algorithm', choices=KEY_ALGORITHMS, default='rsa',
+                        help='Private key algorithm (rsa for legacy bulb compatibility, default; '
+                             'ecdsa P-256 or ed25519 generate much faster)')
     parser.add_argument('--verbose', action='store_true', help='Verbose logging')
     
     args = parser.parse_args()
@@ -391,7 +675,7 @@ def main():
     )
     
     # Create certificate manager
-    cert_manager = CertificateManager(args.output_dir)
+    cert_manager = CertificateManager(args.output_dir, key_algorithm=args.key_algorithm)
     
     if args.info:
         # Show certificate information
@@ -404,7 +688,8 @@ def main():
         san_list = args.san if args.san else None
         # Use simple mode unless --full is explicitly specified
         simple_mode = not args.full
-        success = cert_manager.generate_all_certificates(args.common_name, san_list, simple_mode=simple_mode)
+        success = cert_manager.generate_all_certificates(args.common_name, san_list, simple_mode=simple_mode,
+                                                         force=args.force)
         
         if success:
             logger.info("Certificate generation completed successfully")
@@ -423,5 +708,4 @@ def main():
 
 
 if __name__ == '__main__':
-    import json
     exit(main())
\ No newline at end of file
@@ -4,18 +4,69 @@ Configuration manager for dynamic Mosquitto configuration generation
 """
 import json
 import argparse
+import base64
+import hashlib
 import logging
+import os
+import secrets
+import subprocess
+from functools import lru_cache
 from pathlib import Path
-from jinja2 import Template, Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, ChoiceLoader, ModuleLoader
 
 logger = logging.getLogger(__name__)
 
+# Templates pre-compiled at image build time (see build_templates.py), and
+# the source directory they were compiled from (see Dockerfile)
+COMPILED_TEMPLATE_DIR = Path("/usr/local/share/j2_compiled")
+COMPILED_TEMPLATE_SOURCE = Path("/usr/local/mosquitto")
+
+# Mosquitto 2.x password hashing parameters (matches mosquitto_passwd defaults)
+PASSWD_ITERATIONS = 101
+PASSWD_SALT_BYTES = 12
+
+
+@lru_cache(maxsize=8)
+def _get_template(template_dir: str, template_name: str):
+    """Load and compile a template once per (directory, name) pair"""
+    loader = FileSystemLoader(template_dir)
+    # Compiled modules are looked up by name only, so they are only valid for
+    # the directory they were built from
+    if COMPILED_TEMPLATE_DIR.is_dir() and Path(template_dir).resolve() == COMPILED_TEMPLATE_SOURCE.resolve():
+        # Prefer the pre-compiled module, falling back to parsing the source
+        loader = ChoiceLoader([ModuleLoader(str(COMPILED_TEMPLATE_DIR)), loader])
+    
+    env = Environment(
+        loader=loader,
+        auto_reload=False,
+        cache_size=64
+    )
+    return env.get_template(template_name)
+
+
+def _atomic_write(path, text: str):
+    """Write a file via temp file + rename so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Don't leave a partial temp file next to the config
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
 
 def load_addon_config(config_path: str) -> dict:
     """Load Home Assistant add-on configuration"""
     try:
-        with open(config_path, 'r') as f:
-            config = json.load(f)
+        # json parses UTF-8 bytes directly, skipping a separate text decode pass
+        config = json.loads(Path(config_path).read_bytes())
         logger.info(f"Loaded configuration from {config_path}")
         return config
     except Exception as e:
@@ -38,12 +89,10 @@ def generate_mosquitto_config(template_path: str, output_path: str,
         bool: True if successful, False otherwise
     """
     try:
-        # Load template
+        # Load template (compiled once and reused on repeat calls)
         template_dir = Path(template_path).parent
         template_name = Path(template_path).name
-        
-        env = Environment(loader=FileSystemLoader(str(template_dir)))
-        template = env.get_template(template_name)
+        template = _get_template(str(template_dir), template_name)
         
         # Prepare template variables
         template_vars = {
@@ -64,8 +113,7 @@ def generate_mosquitto_config(template_path: str, output_path: str,
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(output_path, 'w') as f:
-            f.write(rendered_config)
+        _atomic_write(output_path, rendered_config)
         
         logger.info(f"Generated Mosquitto configuration: {output_path}")
         logger.info(f"Bridge enabled: {template_vars['enable_bridge']}")
@@ -78,13 +126,36 @@ def generate_mosquitto_config(template_path: str, output_path: str,
         return False
 
 
-def create_password_file(config: dict, output_dir: str) -> bool:
+def hash_mosquitto_password(password: str, iterations: int = PASSWD_ITERATIONS) -> str:
+    """
+    Hash a password in Mosquitto 2.x password file format
+    
+    Produces the same "$7$" PBKDF2-SHA512 entry as mosquitto_passwd, computed
+    in-process instead of spawning the tool.
+    
+    Args:
+        password: Plain text password
+        iterations: PBKDF2 iteration count
+        
+    Returns:
+        str: Hash string in the form $7$<iterations>$<salt>$<hash>
+    """
+    salt = secrets.token_bytes(PASSWD_SALT_BYTES)
+    derived = hashlib.pbkdf2_hmac('sha512', password.encode('utf-8'), salt, iterations, dklen=64)
+    return (f"$7${iterations}${base64.b64encode(salt).decode()}"
+            f"${base64.b64encode(derived).decode()}")
+
+
+def create_password_file(config: dict, output_dir: str,
+                         use_mosquitto_passwd: bool = False) -> bool:
     """
     Create Mosquitto password file if authentication is enabled
     
     Args:
         config: Add-on configuration dictionary
         output_dir: Directory to write the password file
+        use_mosquitto_passwd: Hash with the mosquitto_passwd tool (e.g. for
+            Mosquitto 1.x) instead of in-process PBKDF2-SHA512
         
     Returns:
         bool: True if successful or not needed, False if failed
@@ -97,43 +168,59 @@ def create_password_file(config: dict, output_dir: str) -> bool:
         return True
     
     try:
-        import subprocess
-        
         passwd_file = Path(output_dir) / "passwd"
         
-        # Create password file using mosquitto_passwd
-        cmd = ['mosquitto_passwd', '-c', str(passwd_file), username]
-        
-        # Run mosquitto_passwd with password input
-        process = subprocess.run(
-            cmd, 
-            input=f"{password}\n{password}\n", 
-            text=True, 
-            capture_output=True
-        )
-        
-        if process.returncode == 0:
-            logger.info(f"Created password file: {passwd_file}")
-            return True
-        else:
-            logger.error(f"mosquitto_passwd failed: {process.stderr}")
+        if use_mosquitto_passwd:
+            # Create password file using mosquitto_passwd
+            cmd = ['mosquitto_passwd', '-c', str(passwd_file), username]
+            
+            # Run mosquitto_passwd with password input
+            process = subprocess.run(
+                cmd, 
+                input=f"{password}\n{password}\n", 
+                text=True, 
+                capture_output=True
+            )
             
-            # Fallback: create simple password file
-            # Note: This is less secure, consider using mosquitto_passwd in production
-            with open(passwd_file, 'w') as f:
-                f.write(f"{username}:{password}\n")
+            if process.returncode == 0:
+                logger.info(f"Created password file: {passwd_file}")
+                return True
             
-            logger.warning("Created simple password file (less secure)")
-            return True
+            logger.error(f"mosquitto_passwd failed: {process.stderr}")
+            logger.warning("Falling back to in-process password hashing")
+        
+        _atomic_write(passwd_file, f"{username}:{hash_mosquitto_password(password)}\n")
+        
+        logger.info(f"Created password file: {passwd_file}")
+        return True
             
     except Exception as e:
         logger.error(f"Failed to create password file: {e}")
         return False
 
 
+def _is_port(value) -> bool:
+    """Check for an integer TCP port (bools are ints in Python, so reject them)"""
+    return isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= 65535
+
+
+def _is_log_level(value) -> bool:
+    """Check for a supported log level name"""
+    return isinstance(value, str) and value.lower() in ('debug', 'info', 'warning', 'error')
+
+
+# Validation rules: (field, default, check, error message format)
+CONFIG_RULES = (
+    ('mqtt_broker_port', 1883, _is_port, "Invalid MQTT broker port: {}"),
+    ('mqtt_ssl', False, lambda v: isinstance(v, bool), "Field mqtt_ssl must be boolean, got {!r}"),
+    ('enable_bridge', True, lambda v: isinstance(v, bool), "Field enable_bridge must be boolean, got {!r}"),
+    ('log_level', 'info', _is_log_level, "Invalid log level: {}"),
+)
+
+
 def validate_config(config: dict) -> bool:
     """
-    Validate add-on configuration
+    Validate add-on configuration against CONFIG_RULES in a single pass
     
     Args:
         config: Configuration dictionary to validate
@@ -141,33 +228,12 @@ def validate_config(config: dict) -> bool:
     Returns:
         bool: True if configuration is valid
     """
-    required_fields = []  # No strictly required fields for basic operation
-    
-    for field in required_fields:
-        if field not in config:
-            logger.error(f"Missing required configuration field: {field}")
-            return False
-    
-    # Validate port numbers
-    mqtt_port = config.get('mqtt_broker_port', 1883)
-    if not isinstance(mqtt_port, int) or not (1 <= mqtt_port <= 65535):
-        logger.error(f"Invalid MQTT broker port: {mqtt_port}")
-        return False
-    
-    # Validate boolean fields
-    bool_fields = ['mqtt_ssl', 'enable_bridge']
-    for field in bool_fields:
-        if field in config and not isinstance(config[field], bool):
-            logger.error(f"Field {field} must be boolean")
+    for field, default, check, message in CONFIG_RULES:
+        value = config.get(field, default)
+        if not check(value):
+            logger.error(message.format(value))
             return False
     
-    # Validate log level
-    valid_log_levels = ['debug', 'info', 'warning', 'error']
-    log_level = config.get('log_level', 'info').lower()
-    if log_level not in valid_log_levels:
-        logger.error(f"Invalid log level: {log_level}")
-        return False
-    
     logger.info("Configuration validation passed")
     return True
 
@@ -3,19 +3,90 @@
 Device Storage Manager for Sengled Local Server
 
 Handles persistent storage of device information from MQTT status messages.
-Stores device data as JSON files in /data/devices/ for HA add-on persistence.
+Stores one JSON file per device (/data/devices/<MAC>.json) for HA add-on
+persistence, so an update only rewrites the device that changed.
 """
 
-import json
 import os
+import re
+import sys
 import time
 import logging
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
+# Device status topics look like wifielement/<MAC>/status
+STATUS_TOPIC_PREFIX = 'wifielement/'
+STATUS_TOPIC_SUFFIX = '/status'
+
+# Splits "brightness, switch,color" into stripped capability names in one pass
+_CAPS_SPLIT = re.compile(r'\s*,\s*')
+
+# Sentinel for attribute lookups where None is a possible stored value
+_MISSING = object()
+
+def normalize_mac(mac: str) -> str:
+    """Canonical (uppercase, interned) form of a MAC used as the device key"""
+    return sys.intern(mac.upper())
+
+def status_topic_mac(topic: str) -> Optional[str]:
+    """
+    Normalized MAC for a device status topic (wifielement/<MAC>/status),
+    or None for any other topic (individual attribute updates, consumption...)
+    """
+    if not (topic.startswith(STATUS_TOPIC_PREFIX) and topic.endswith(STATUS_TOPIC_SUFFIX)):
+        return None
+    mac = topic[len(STATUS_TOPIC_PREFIX):-len(STATUS_TOPIC_SUFFIX)]
+    if not mac or '/' in mac:
+        return None
+    return normalize_mac(mac)
+
+class Device:
+    """In-memory record for one bulb (slots keep per-device overhead low)"""
+    
+    __slots__ = ('mac', 'first_seen', 'last_seen', 'capabilities', 'attributes',
+                 'attributes_size', 'saved_last_seen')
+    
+    def __init__(self, mac: str, first_seen: int, last_seen: int,
+                 capabilities: Optional[List[str]] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.mac = mac
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.capabilities = capabilities if capabilities is not None else []
+        self.attributes = attributes if attributes is not None else {}
+        # Upper bound on the encoded size of attributes, see update_device
+        self.attributes_size = len(orjson.dumps(self.attributes))
+        # last_seen as of the last time this device was marked for saving
+        self.saved_last_seen = last_seen
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Device':
+        """Build a device from its stored JSON form"""
+        return cls(
+            mac=data.get('mac'),
+            first_seen=data.get('first_seen', 0),
+            last_seen=data.get('last_seen', 0),
+            capabilities=data.get('capabilities'),
+            attributes=data.get('attributes'),
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON form used for storage and the HTTP API"""
+        return {
+            'mac': self.mac,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'capabilities': self.capabilities,
+            'attributes': self.attributes,
+        }
+
 class DeviceStorage:
     """Manages persistent device storage and retrieval"""
     
@@ -24,48 +95,186 @@ class DeviceStorage:
     MAX_DEVICE_SIZE_BYTES = 1024 * 1024  # 1MB per device
     MAX_TOTAL_SIZE_BYTES = 10 * 1024 * 1024  # 10MB total storage
     
+    # Seconds between background flushes of pending changes to disk
+    FLUSH_INTERVAL = 5
+    
+    # Seconds between saves of a device whose status hasn't changed, just to
+    # keep its last_seen on disk reasonably fresh
+    LAST_SEEN_SAVE_INTERVAL = 3600
+    
     def __init__(self, storage_dir: str = "/data/devices"):
         """Initialize device storage with specified directory"""
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
-        self.devices_file = self.storage_dir / "devices.json"
+        # Single-file store used by earlier versions, migrated on first load
+        self.legacy_devices_file = self.storage_dir / "devices.json"
         
-        # In-memory cache for quick access
+        # In-memory cache for quick access, plus the encoded JSON of each
+        # device (dropped whenever the device changes)
         self._devices = {}
+        self._device_json_cache = {}
+        # On-disk size of each device file and their running total, kept
+        # current by every write and removal so stats never touch the disk
+        self._file_sizes = {}
+        self._total_file_size = 0
+        self._lock = threading.Lock()
         self._load_devices()
         
+        # Most recent last_seen across devices, kept current by update_device
+        self._max_last_seen = self._compute_max_last_seen()
+        
+        # Updates only record the MAC as dirty; a background thread batches them
+        # into one write per device per FLUSH_INTERVAL instead of one per message
+        self._dirty = set()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+        
         logger.info(f"Device storage initialized at {self.storage_dir}")
         logger.info(f"Storage limits: {self.MAX_DEVICES} devices, {self.MAX_DEVICE_SIZE_BYTES//1024}KB per device")
     
+    def _compute_max_last_seen(self) -> int:
+        """Scan all devices for the most recent last_seen timestamp"""
+        return max((device.last_seen for device in self._devices.values()), default=0)
+    
+    def _device_file(self, mac: str) -> Path:
+        """Path of the JSON file holding a single device"""
+        return self.storage_dir / f"{mac}.json"
+    
+    def _set_file_size(self, mac: str, size: int):
+        """Record the on-disk size of a device file (0 once it's removed)"""
+        old_size = self._file_sizes.pop(mac, 0)
+        if size:
+            self._file_sizes[mac] = size
+        self._total_file_size += size - old_size
+    
     def _load_devices(self):
         """Load devices from persistent storage"""
+        self._devices = {}
+        
+        # A failed migration must not stop the per-device files from loading
         try:
-            if self.devices_file.exists():
-                with open(self.devices_file, 'r') as f:
-                    self._devices = json.load(f)
+            self._migrate_legacy_file()
+        except Exception as e:
+            logger.error("Failed to migrate legacy devices.json: %s", e)
+        
+        try:
+            for device_file in self.storage_dir.glob("*.json"):
+                if device_file == self.legacy_devices_file:
+                    continue
+                try:
+                    with open(device_file, 'rb') as f:
+                        raw = f.read()
+                    self._devices[device_file.stem] = Device.from_dict(orjson.loads(raw))
+                    self._set_file_size(device_file.stem, len(raw))
+                except Exception as e:
+                    logger.error(f"Failed to load device file {device_file.name}: {e}")
+            
+            if self._devices:
                 logger.info(f"Loaded {len(self._devices)} devices from storage")
             else:
-                self._devices = {}
                 logger.info("No existing device storage found, starting fresh")
         except Exception as e:
             logger.error(f"Failed to load devices: {e}")
             self._devices = {}
     
-    def _save_devices(self):
-        """Save devices to persistent storage"""
+    def _migrate_legacy_file(self):
+        """Split an old monolithic devices.json into per-device files"""
+        if not self.legacy_devices_file.exists():
+            return
+        
+        try:
+            with open(self.legacy_devices_file, 'rb') as f:
+                legacy_devices = orjson.loads(f.read())
+            if not isinstance(legacy_devices, dict):
+                raise ValueError("expected a JSON object of devices")
+        except (OSError, ValueError) as e:
+            # Move a corrupt file aside so it isn't retried on every boot
+            corrupt_file = self.legacy_devices_file.with_name(self.legacy_devices_file.name + '.corrupt')
+            self.legacy_devices_file.replace(corrupt_file)
+            logger.error("Legacy devices.json is unreadable (%s), moved to %s", e, corrupt_file.name)
+            return
+        
+        for mac, device in legacy_devices.items():
+            if not self._save_device(mac, orjson.dumps(device)):
+                logger.warning("Keeping legacy devices.json until migration succeeds")
+                return
+        
+        self.legacy_devices_file.unlink()
+        logger.info(f"Migrated {len(legacy_devices)} devices from legacy devices.json")
+    
+    def _device_json(self, mac: str) -> Optional[bytes]:
+        """Encoded JSON for a device, reusing the cached bytes if unchanged
+        
+        Must be called with self._lock held.
+        """
+        data = self._device_json_cache.get(mac)
+        if data is None:
+            device = self._devices.get(mac)
+            if device is None:
+                return None
+            data = self._device_json_cache[mac] = orjson.dumps(device.to_dict())
+        return data
+    
+    def _save_device(self, mac: str, data: bytes) -> bool:
+        """Save a single device's encoded JSON to persistent storage"""
+        device_file = self._device_file(mac)
         try:
             # Write to temporary file first, then atomic rename
-            temp_file = self.devices_file.with_suffix('.tmp')
-            with open(temp_file, 'w') as f:
-                json.dump(self._devices, f, indent=2)
+            temp_file = device_file.with_suffix('.tmp')
+            with open(temp_file, 'wb') as f:
+                f.write(data)
             
             # Atomic rename on Unix systems
-            temp_file.replace(self.devices_file)
-            logger.debug(f"Saved {len(self._devices)} devices to storage")
+            temp_file.replace(device_file)
+            self._set_file_size(mac, len(data))
+            return True
         except Exception as e:
-            logger.error(f"Failed to save devices: {e}")
+            logger.error(f"Failed to save device {mac}: {e}")
+            return False
+    
+    def _save_devices(self, pending: Dict[str, Optional[bytes]]):
+        """Write changed devices to disk and remove files of deleted ones"""
+        for mac, data in pending.items():
+            if data is not None:
+                self._save_device(mac, data)
+            else:
+                try:
+                    self._device_file(mac).unlink()
+                    self._set_file_size(mac, 0)
+                except FileNotFoundError:
+                    self._set_file_size(mac, 0)
+                except Exception as e:
+                    logger.error(f"Failed to remove device file for {mac}: {e}")
+        logger.debug("Saved %d changed devices to storage", len(pending))
+    
+    def _flush_loop(self):
+        """Background thread: periodically persist pending changes"""
+        while not self._stop_event.wait(self.FLUSH_INTERVAL):
+            self.flush()
+    
+    def flush(self):
+        """Write devices that changed since the last flush to disk"""
+        with self._flush_lock:
+            if not self._dirty:
+                return
+            # Encode under the lock, then do the file I/O without blocking
+            # incoming updates; anything changed meanwhile is already in the
+            # fresh dirty set for the next flush
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                pending = {mac: self._device_json(mac) for mac in dirty}
+            self._save_devices(pending)
     
-    def parse_status_message(self, payload: str) -> Optional[Dict[str, Any]]:
+    def close(self):
+        """Stop the background flush thread and persist pending changes"""
+        self._stop_event.set()
+        if self._flush_thread.is_alive():
+            self._flush_thread.join(timeout=self.FLUSH_INTERVAL + 1)
+        self.flush()
+    
+    def parse_status_message(self, payload: bytes) -> Optional[Dict[str, Any]]:
         """
         Parse MQTT status message payload into structured data
         
@@ -74,29 +283,22 @@ class DeviceStorage:
         """
         try:
             # Parse JSON array
-            status_list = json.loads(payload)
+            status_list = orjson.loads(payload)
             
             if not isinstance(status_list, list) or not status_list:
                 return None
             
-            # Convert list of status items to dictionary
-            parsed_data = {}
-            mac = None
-            
-            for item in status_list:
-                if not isinstance(item, dict):
-                    continue
-                
-                # Extract MAC from first item
-                if mac is None:
-                    mac = item.get('dn')
-                
-                # Add type/value pairs
-                type_key = item.get('type')
-                value = item.get('value')
-                
-                if type_key and value is not None:
-                    parsed_data[type_key] = value
+            # Fast path for the shape bulbs always send; anything unexpected
+            # (missing keys, non-dict items, non-string types) takes the slow path
+            try:
+                mac = status_list[0]['dn']
+                parsed_data = {
+                    sys.intern(item['type']): item['value']
+                    for item in status_list
+                    if item['type'] and item['value'] is not None
+                }
+            except (KeyError, TypeError, IndexError):
+                mac, parsed_data = self._parse_status_items(status_list)
             
             return {
                 'mac': mac,
@@ -104,148 +306,211 @@ class DeviceStorage:
                 'timestamp': int(time.time() * 1000)  # milliseconds
             }
             
-        except (json.JSONDecodeError, KeyError, TypeError) as e:
-            logger.warning(f"Failed to parse status message: {e}")
+        except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+            logger.warning("Failed to parse status message: %s", e)
             return None
     
+    @staticmethod
+    def _parse_status_items(status_list: List[Any]):
+        """Defensive parse of status items, skipping anything malformed"""
+        # Convert list of status items to dictionary
+        parsed_data = {}
+        mac = None
+        
+        for item in status_list:
+            if not isinstance(item, dict):
+                continue
+            
+            # Extract MAC from first item
+            if mac is None:
+                mac = item.get('dn')
+            
+            # Add type/value pairs. The same few type names repeat across
+            # every device and message, so intern them to share one key object.
+            type_key = item.get('type')
+            value = item.get('value')
+            
+            if type_key and isinstance(type_key, str) and value is not None:
+                parsed_data[sys.intern(type_key)] = value
+        
+        return mac, parsed_data
+    
     def update_device(self, mac: str, status_data: Dict[str, Any]):
-        """Update device information from parsed status data"""
+        """Update device information from parsed status data
+        
+        The MAC must already be normalized with normalize_mac().
+        """
         if not mac:
             logger.warning("Cannot update device without MAC address")
             return False
         
-        mac = mac.upper()  # Normalize MAC address format
+        with self._lock:
+            return self._update_device(mac, status_data)
+    
+    def _update_device(self, mac: str, status_data: Dict[str, Any]):
+        """Apply a status update to one device (called with self._lock held)"""
         current_time = int(time.time() * 1000)
         
         # Check device count limit (only for new devices)
         is_new_device = mac not in self._devices
         if is_new_device and len(self._devices) >= self.MAX_DEVICES:
-            logger.warning(f"Device limit reached ({self.MAX_DEVICES}), ignoring new device {mac}")
+            logger.warning("Device limit reached (%d), ignoring new device %s", self.MAX_DEVICES, mac)
             return False
         
         # Get existing device or create new one
-        device = self._devices.get(mac, {
-            'mac': mac,
-            'first_seen': current_time,
-            'last_seen': current_time,
-            'capabilities': [],
-            'attributes': {}
-        })
+        device = self._devices.get(mac) or Device(mac, current_time, current_time)
         
         # Update last seen timestamp
-        device['last_seen'] = current_time
+        device.last_seen = current_time
+        self._max_last_seen = max(self._max_last_seen, current_time)
         
-        # Update attributes from status data with size checking
-        if 'attributes' in status_data:
-            # Create updated attributes dict
-            updated_attributes = device['attributes'].copy()
-            updated_attributes.update(status_data['attributes'])
+        # Update attributes from status data with size checking. Bulbs
+        # repeat identical statuses as heartbeats; those change nothing.
+        changed = is_new_device
+        new_attributes = status_data.get('attributes')
+        current_attributes = device.attributes
+        if new_attributes and any(current_attributes.get(key, _MISSING) != value
+                                  for key, value in new_attributes.items()):
+            changed = True
             
-            # Check device size limit
-            device_json = json.dumps(updated_attributes)
-            if len(device_json.encode('utf-8')) > self.MAX_DEVICE_SIZE_BYTES:
-                logger.warning(f"Device {mac} data too large ({len(device_json)} chars), skipping update")
-                return False
+            # Cheap upper bound: old size plus the new attributes on their own
+            # (keys being overwritten are counted twice). Only when that gets
+            # near the limit is the merged dict encoded for an exact size.
+            attributes_size = device.attributes_size + len(orjson.dumps(new_attributes))
+            if attributes_size > self.MAX_DEVICE_SIZE_BYTES:
+                updated_attributes = {**device.attributes, **new_attributes}
+                attributes_size = len(orjson.dumps(updated_attributes))
+                if attributes_size > self.MAX_DEVICE_SIZE_BYTES:
+                    logger.warning("Device %s data too large (%d bytes), skipping update", mac, attributes_size)
+                    return False
+                device.attributes = updated_attributes
+            else:
+                device.attributes.update(new_attributes)
             
-            device['attributes'] = updated_attributes
+            device.attributes_size = attributes_size
+        
+        caps_count = len(device.capabilities)
         
         # Extract capabilities from supportAttributes if present (expand only, never shrink)
-        if 'supportAttributes' in device['attributes']:
-            caps_str = device['attributes']['supportAttributes']
-            new_caps = [cap.strip() for cap in caps_str.split(',') if cap.strip()]
+        if 'supportAttributes' in device.attributes:
+            caps_str = device.attributes['supportAttributes']
+            new_caps = _CAPS_SPLIT.split(caps_str.strip())
             
             # Merge new capabilities with existing ones (no duplicates, preserve order)
-            existing_caps = set(device['capabilities'])
+            existing_caps = set(device.capabilities)
             for cap in new_caps:
-                if cap not in existing_caps:
-                    device['capabilities'].append(cap)
+                if cap and cap not in existing_caps:
+                    device.capabilities.append(cap)
                     existing_caps.add(cap)
             
-            logger.debug(f"Updated capabilities for {mac}: {device['capabilities']}")
+            logger.debug("Updated capabilities for %s: %s", mac, device.capabilities)
         
         # Always ensure basic capabilities are present if we see evidence of them
         # This helps with devices that under-report their supportAttributes
         implied_caps = []
         
         # If device reports brightness/color/temp values, it likely supports them
-        if 'brightness' in device['attributes'] and 'brightness' not in device['capabilities']:
+        if 'brightness' in device.attributes and 'brightness' not in device.capabilities:
             implied_caps.append('brightness')
-        if 'color' in device['attributes'] and 'color' not in device['capabilities']:
+        if 'color' in device.attributes and 'color' not in device.capabilities:
             implied_caps.append('color') 
-        if 'colorTemperature' in device['attributes'] and 'colorTemperature' not in device['capabilities']:
+        if 'colorTemperature' in device.attributes and 'colorTemperature' not in device.capabilities:
             implied_caps.append('colorTemperature')
-        if 'switch' in device['attributes'] and 'switch' not in device['capabilities']:
+        if 'switch' in device.attributes and 'switch' not in device.capabilities:
             implied_caps.append('switch')
             
         # Add implied capabilities
         for cap in implied_caps:
-            if cap not in device['capabilities']:
-                device['capabilities'].append(cap)
-                logger.debug(f"Added implied capability '{cap}' for {mac}")
+            if cap not in device.capabilities:
+                device.capabilities.append(cap)
+                logger.debug("Added implied capability '%s' for %s", cap, mac)
         
         # Sort capabilities for consistent output (optional)
-        device['capabilities'].sort()
+        device.capabilities.sort()
         
-        # Store updated device
+        changed = changed or len(device.capabilities) != caps_count
+        
+        # Store updated device; only queue a disk write when something
+        # changed or the saved last_seen has gone stale
         self._devices[mac] = device
-        self._save_devices()
+        if changed or current_time - device.saved_last_seen >= self.LAST_SEEN_SAVE_INTERVAL * 1000:
+            device.saved_last_seen = current_time
+            self._device_json_cache.pop(mac, None)
+            self._dirty.add(mac)
         
-        logger.info(f"Updated device {mac} with {len(status_data.get('attributes', {}))} attributes")
+        logger.info("Updated device %s with %d attributes", mac, len(status_data.get('attributes', {})))
         return True
     
-    def process_mqtt_message(self, topic: str, payload: str) -> bool:
+    def process_mqtt_message(self, topic: str, payload: bytes) -> bool:
         """
         Process incoming MQTT message and update device storage
         
         Args:
             topic: MQTT topic (e.g., "wifielement/B0:CE:18:C3:3A:A2/status")
-            payload: Message payload
+            payload: Raw message payload (UTF-8 JSON bytes)
             
         Returns:
             True if processed successfully, False otherwise
         """
-        try:
-            # Extract MAC from topic
-            topic_parts = topic.split('/')
-            if len(topic_parts) < 3 or topic_parts[0] != 'wifielement':
-                logger.debug(f"Ignoring non-device topic: {topic}")
-                return False
-            
-            mac = topic_parts[1]
-            message_type = topic_parts[2]
-            
-            # Only process status messages (ignore individual attribute updates)
-            if message_type != 'status':
-                logger.debug(f"Ignoring non-status message: {topic}")
-                return False
+        mac = status_topic_mac(topic)
+        if mac is None:
+            logger.debug("Ignoring non-status message: %s", topic)
+            return False
+        return self.process_status_payload(mac, payload)
+    
+    def process_status_payload(self, mac: str, payload: bytes) -> bool:
+        """
+        Process the payload of a device status message
+        
+        Args:
+            mac: Normalized MAC, as returned by status_topic_mac()
+            payload: Raw message payload (UTF-8 JSON bytes)
             
+        Returns:
+            True if processed successfully, False otherwise
+        """
+        try:
             # Parse the status payload
             parsed = self.parse_status_message(payload)
             if not parsed:
-                logger.warning(f"Failed to parse status message from {mac}")
+                logger.warning("Failed to parse status message from %s", mac)
                 return False
             
             # Only process comprehensive status messages (not single attributes)
             # This filters out the short "supportAttributes" messages
             if len(parsed['attributes']) < 5:  # Threshold for "comprehensive" status
-                logger.debug(f"Skipping short status message from {mac} ({len(parsed['attributes'])} attributes)")
+                logger.debug("Skipping short status message from %s (%d attributes)", mac, len(parsed['attributes']))
                 return False
             
             # Update device storage
             return self.update_device(mac, parsed)
             
         except Exception as e:
-            logger.error(f"Error processing MQTT message {topic}: {e}")
+            logger.error("Error processing status message from %s: %s", mac, e)
             return False
     
     def get_device(self, mac: str) -> Optional[Dict[str, Any]]:
         """Get single device by MAC address"""
-        mac = mac.upper()
-        return self._devices.get(mac)
+        device = self._devices.get(normalize_mac(mac))
+        return device.to_dict() if device is not None else None
     
     def get_all_devices(self) -> Dict[str, Dict[str, Any]]:
         """Get all devices grouped by MAC address"""
-        return dict(self._devices)
+        return {mac: device.to_dict() for mac, device in list(self._devices.items())}
+    
+    def get_all_devices_json(self) -> Dict[str, bytes]:
+        """Get every device's encoded JSON, grouped by MAC address
+        
+        The cached bytes are reused while they still carry the device's
+        current last_seen; heartbeats advance last_seen without touching
+        the cache, so those devices are encoded fresh.
+        """
+        with self._lock:
+            return {
+                mac: (self._device_json(mac) if device.last_seen == device.saved_last_seen
+                      else orjson.dumps(device.to_dict()))
+                for mac, device in self._devices.items()
+            }
     
     def get_device_count(self) -> int:
         """Get total number of stored devices"""
@@ -255,26 +520,27 @@ class DeviceStorage:
         """Remove devices not seen for specified number of days"""
         cutoff_time = int((time.time() - (max_age_days * 24 * 3600)) * 1000)
         
-        old_devices = [
-            mac for mac, device in self._devices.items()
-            if device.get('last_seen', 0) < cutoff_time
-        ]
-        
-        for mac in old_devices:
-            del self._devices[mac]
-            logger.info(f"Removed old device {mac}")
-        
-        if old_devices:
-            self._save_devices()
+        with self._lock:
+            # Single pass: keep recent devices, queue file removal for the rest
+            kept = {}
+            for mac, device in self._devices.items():
+                if device.last_seen >= cutoff_time:
+                    kept[mac] = device
+                else:
+                    self._device_json_cache.pop(mac, None)
+                    self._dirty.add(mac)
+            
+            removed = len(self._devices) - len(kept)
+            if removed:
+                self._devices = kept
+                self._max_last_seen = self._compute_max_last_seen()
+                logger.info("Removed %d devices not seen in %d days", removed, max_age_days)
         
-        return len(old_devices)
+        return removed
     
     def get_storage_stats(self) -> Dict[str, Any]:
         """Get storage statistics and health info"""
-        try:
-            file_size = self.devices_file.stat().st_size if self.devices_file.exists() else 0
-        except:
-            file_size = 0
+        file_size = self._total_file_size
         
         # Calculate storage usage
         total_devices = len(self._devices)
@@ -285,11 +551,12 @@ class DeviceStorage:
             'total_devices': total_devices,
             'max_devices': self.MAX_DEVICES,
             'device_usage_percent': round(device_usage_pct, 1),
-            'storage_file': str(self.devices_file),
+            'storage_file': str(self.storage_dir),
+            'storage_dir': str(self.storage_dir),
             'file_size_bytes': file_size,
             'max_file_size_bytes': self.MAX_TOTAL_SIZE_BYTES,
             'storage_usage_percent': round(storage_usage_pct, 1),
-            'last_updated': max([dev.get('last_seen', 0) for dev in self._devices.values()] or [0]),
+            'last_updated': self._max_last_seen,
             'limits': {
                 'max_devices': self.MAX_DEVICES,
                 'max_device_size_bytes': self.MAX_DEVICE_SIZE_BYTES,
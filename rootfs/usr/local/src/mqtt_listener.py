@@ -10,17 +10,45 @@ import os
 import ssl
 import time
 import logging
-import threading
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
 import paho.mqtt.client as mqtt
 
-from device_storage import DeviceStorage
-from network_utils import get_addon_ip
+from device_storage import DeviceStorage, status_topic_mac
+from network_utils import IP_CACHE_TTL, get_addon_ip
 
 logger = logging.getLogger(__name__)
 
+# Bound on the topic -> MAC cache; real topics number about 3 per bulb
+MAX_CACHED_TOPICS = 1024
+
+_UNSEEN = object()
+
+# Device topics subscribed on every (re)connect
+_SUBSCRIBE_TOPICS = (
+    ("wifielement/+/status", 0),           # Device status messages
+    ("wifielement/+/consumptionTime", 0),  # Optional consumption data
+    ("wifielement/+/consumption", 0),      # Optional consumption data
+)
+
+
+@lru_cache(maxsize=None)
+def _relaxed_ssl_context() -> ssl.SSLContext:
+    """
+    Shared client context that accepts any certificate, like the bulbs do.
+    
+    Built once per process. A bare PROTOCOL_TLS_CLIENT context also skips
+    create_default_context()'s load of the system CA bundle, which would be
+    unused with verification off.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
 class SengledMQTTListener:
     """MQTT listener for Sengled device status messages"""
     
@@ -35,13 +63,20 @@ class SengledMQTTListener:
             storage_dir: Directory for device storage
             certs_dir: Directory containing SSL certificates
         """
+        # Re-detect an auto-detected host after connection failures in case it moved
+        self._auto_detect_host = broker_host is None
         self.broker_host = broker_host or get_addon_ip()
+        self._last_host_detect = time.monotonic()
         self.broker_port = broker_port
         self.certs_dir = Path(certs_dir)
         
         # Initialize device storage
         self.storage = DeviceStorage(storage_dir)
         
+        # Topic -> normalized MAC (None for non-status topics), so each
+        # distinct topic is only parsed once
+        self._topic_macs = {}
+        
         # MQTT client setup
         self.client = mqtt.Client(
             client_id="sengled-server-listener",
@@ -52,16 +87,17 @@ class SengledMQTTListener:
         # Connection state
         self.connected = False
         self.running = False
-        self.listener_thread = None
         
         # Statistics
-        self.stats = {
-            'messages_received': 0,
-            'messages_processed': 0,
-            'connection_attempts': 0,
-            'last_message': None,
-            'start_time': time.time()
-        }
+        self._msgs_received = 0
+        self._msgs_processed = 0
+        self._conn_attempts = 0
+        self._last_msg = None  # paho's monotonic receive timestamp
+        self._start_time = time.time()
+        
+        # Debug logging snapshot for the message hot path; the add-on sets
+        # its log level once at startup
+        self._dbg = logger.isEnabledFor(logging.DEBUG)
         
         self._setup_mqtt_client()
         
@@ -72,11 +108,7 @@ class SengledMQTTListener:
             if self.broker_port == 28527:
                 # Use relaxed SSL validation for internal broker with self-signed certs
                 # This matches how Sengled bulbs connect - they accept any SSL certificate
-                context = ssl.create_default_context()
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE  # Accept any certificate (like bulbs)
-                
-                self.client.tls_set_context(context)
+                self.client.tls_set_context(_relaxed_ssl_context())
                 logger.info("SSL/TLS configured with relaxed validation (bulb-compatible)")
             else:
                 logger.info(f"Connecting to external broker {self.broker_host}:{self.broker_port} without SSL")
@@ -87,33 +119,51 @@ class SengledMQTTListener:
         # Set up callbacks
         self.client.on_connect = self._on_connect
         self.client.on_disconnect = self._on_disconnect
+        self.client.on_connect_fail = self._on_connect_fail
         self.client.on_message = self._on_message
-        self.client.on_log = self._on_log
+        # Hand paho our logger instead of an on_log callback: paho then defers
+        # formatting to logging, so filtered-out packet traces cost only a
+        # level check rather than a formatted string plus a Python callout.
+        # paho only emits DEBUG and ERR records, as the old callback mapped them.
+        self.client.enable_logger(logging.getLogger(f"{__name__}.paho"))
         
         # Connection settings
         self.client.reconnect_delay_set(min_delay=1, max_delay=120)
         
     def _on_connect(self, client, userdata, flags, rc):
         """Callback for successful MQTT connection"""
+        self._conn_attempts += 1
         if rc == 0:
             self.connected = True
             logger.info(f"Connected to MQTT broker at {self.broker_host}:{self.broker_port}")
             
-            # Subscribe to all device status topics
-            topics = [
-                ("wifielement/+/status", 0),           # Device status messages
-                ("wifielement/+/consumptionTime", 0),  # Optional consumption data
-                ("wifielement/+/consumption", 0),      # Optional consumption data
-            ]
-            
-            for topic, qos in topics:
-                result = client.subscribe(topic, qos)
-                logger.info(f"Subscribed to {topic} (result: {result})")
+            # Subscribe to all device topics in one SUBSCRIBE packet (and one
+            # SUBACK); paho only accepts a list for the multi-topic form
+            result, mid = client.subscribe(list(_SUBSCRIBE_TOPICS))
+            logger.info("Subscribed to %s (result: %s, mid: %s)",
+                        ", ".join(topic for topic, _ in _SUBSCRIBE_TOPICS), result, mid)
                 
         else:
             self.connected = False
             logger.error(f"Failed to connect to MQTT broker: {mqtt.connack_string(rc)}")
     
+    def _on_connect_fail(self, client, userdata):
+        """Callback when a (re)connection attempt fails; paho retries after a backoff"""
+        self._conn_attempts += 1
+        logger.warning("Could not connect to MQTT broker at %s:%s, retrying", self.broker_host, self.broker_port)
+        
+        # Detection blocks paho's network thread (Supervisor calls time out
+        # after seconds), so re-detect at most once per IP_CACHE_TTL
+        now = time.monotonic()
+        if self._auto_detect_host and now - self._last_host_detect >= IP_CACHE_TTL:
+            # Re-detect in case the add-on's address changed
+            self._last_host_detect = now
+            new_host = get_addon_ip(force=True)
+            if new_host != self.broker_host:
+                logger.info("Broker address changed to %s", new_host)
+                self.broker_host = new_host
+                client.connect_async(self.broker_host, self.broker_port, 60)
+    
     def _on_disconnect(self, client, userdata, rc):
         """Callback for MQTT disconnection"""
         self.connected = False
@@ -125,42 +175,46 @@ class SengledMQTTListener:
     def _on_message(self, client, userdata, msg):
         """Callback for received MQTT messages"""
         try:
-            self.stats['messages_received'] += 1
-            self.stats['last_message'] = time.time()
+            self._msgs_received += 1
+            # paho already stamped the message on receive; reuse that instead
+            # of reading the clock again
+            self._last_msg = msg.timestamp
             
             topic = msg.topic
-            payload = msg.payload.decode('utf-8', errors='ignore')
             
-            logger.debug(f"Received message on {topic}: {payload[:100]}...")
+            # Storage parses the raw bytes; only decode for the debug preview
+            if self._dbg:
+                logger.debug("Received message on %s: %s...", topic,
+                             msg.payload[:100].decode('utf-8', errors='ignore'))
+            
+            mac = self._topic_macs.get(topic, _UNSEEN)
+            if mac is _UNSEEN:
+                if len(self._topic_macs) >= MAX_CACHED_TOPICS:
+                    self._topic_macs.clear()
+                mac = self._topic_macs[topic] = status_topic_mac(topic)
             
             # Process the message through device storage
-            if self.storage.process_mqtt_message(topic, payload):
-                self.stats['messages_processed'] += 1
-                logger.debug(f"Successfully processed message from {topic}")
+            if mac is not None and self.storage.process_status_payload(mac, msg.payload):
+                self._msgs_processed += 1
+                if self._dbg:
+                    logger.debug("Successfully processed message from %s", topic)
             
         except Exception as e:
-            logger.error(f"Error processing MQTT message: {e}")
-    
-    def _on_log(self, client, userdata, level, buf):
-        """Callback for MQTT client logging"""
-        if level == mqtt.MQTT_LOG_DEBUG:
-            logger.debug(f"MQTT: {buf}")
-        elif level == mqtt.MQTT_LOG_INFO:
-            logger.debug(f"MQTT: {buf}")
-        elif level == mqtt.MQTT_LOG_WARNING:
-            logger.warning(f"MQTT: {buf}")
-        elif level == mqtt.MQTT_LOG_ERR:
-            logger.error(f"MQTT: {buf}")
+            logger.error("Error processing MQTT message: %s", e)
     
     def start(self):
-        """Start the MQTT listener in a separate thread"""
+        """Start the MQTT listener on paho's network thread"""
         if self.running:
             logger.warning("MQTT listener is already running")
             return
         
         self.running = True
-        self.listener_thread = threading.Thread(target=self._run_listener, daemon=True)
-        self.listener_thread.start()
+        logger.info("Attempting to connect to MQTT broker at %s:%s", self.broker_host, self.broker_port)
+        
+        # paho's loop thread does the connecting, including retries with the
+        # exponential backoff configured by reconnect_delay_set()
+        self.client.connect_async(self.broker_host, self.broker_port, 60)
+        self.client.loop_start()
         logger.info("MQTT listener started")
     
     def stop(self):
@@ -171,62 +225,23 @@ class SengledMQTTListener:
         logger.info("Stopping MQTT listener...")
         self.running = False
         
-        if self.connected:
-            self.client.disconnect()
+        self.client.disconnect()
+        self.client.loop_stop()
         
-        if self.listener_thread and self.listener_thread.is_alive():
-            self.listener_thread.join(timeout=5.0)
+        # Persist any device updates still waiting for the next flush
+        self.storage.close()
         
         logger.info("MQTT listener stopped")
     
-    def _run_listener(self):
-        """Main listener loop (runs in separate thread)"""
-        retry_delay = 10  # Start with 10 second delay
-        max_retry_delay = 120  # Max 2 minutes between retries
-        
-        while self.running:
-            try:
-                if not self.connected:
-                    logger.info(f"Attempting to connect to MQTT broker at {self.broker_host}:{self.broker_port}")
-                    self.stats['connection_attempts'] += 1
-                    
-                    # Use loop_forever with retry_first_connection=False to prevent automatic retries
-                    # We want to control the retry logic ourselves
-                    try:
-                        result = self.client.connect(self.broker_host, self.broker_port, 60)
-                        if result == 0:
-                            logger.debug("Connection initiated, starting network loop...")
-                            # Use blocking loop_forever but with our own retry control
-                            self.client.loop_forever(retry_first_connection=False)
-                            # If we get here, connection was lost
-                            self.connected = False
-                            logger.warning("MQTT connection lost")
-                        else:
-                            logger.error(f"Failed to connect: {mqtt.error_string(result)}")
-                            raise ConnectionError(f"MQTT connect failed: {result}")
-                            
-                    except Exception as conn_error:
-                        logger.error(f"Connection error: {conn_error}")
-                        if self.connected:
-                            self.client.disconnect()
-                            self.connected = False
-                        
-                        if self.running:  # Only retry if we're still supposed to be running
-                            logger.info(f"Retrying in {retry_delay} seconds...")
-                            time.sleep(retry_delay)
-                            retry_delay = min(retry_delay * 2, max_retry_delay)
-                        continue
-                
-            except Exception as e:
-                logger.error(f"MQTT listener error: {e}")
-                if self.running:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay = min(retry_delay * 2, max_retry_delay)
+    def _last_message_time(self) -> Optional[float]:
+        """Wall-clock time of the last message, from paho's monotonic stamp"""
+        if self._last_msg is None:
+            return None
+        return time.time() - (time.monotonic() - self._last_msg)
     
     def get_status(self) -> dict:
         """Get current status of the MQTT listener"""
-        uptime = time.time() - self.stats['start_time']
+        uptime = time.time() - self._start_time
         
         return {
             'connected': self.connected,
@@ -234,10 +249,10 @@ class SengledMQTTListener:
             'broker': f"{self.broker_host}:{self.broker_port}",
             'uptime_seconds': round(uptime, 2),
             'statistics': {
-                'messages_received': self.stats['messages_received'],
-                'messages_processed': self.stats['messages_processed'],
-                'connection_attempts': self.stats['connection_attempts'],
-                'last_message': self.stats['last_message']
+                'messages_received': self._msgs_received,
+                'messages_processed': self._msgs_processed,
+                'connection_attempts': self._conn_attempts,
+                'last_message': self._last_message_time()
             },
             'storage': self.storage.get_storage_stats()
         }
@@ -246,6 +261,10 @@ class SengledMQTTListener:
         """Get all stored devices"""
         return self.storage.get_all_devices()
     
+    def get_devices_json(self) -> dict:
+        """Get all stored devices as encoded JSON bytes"""
+        return self.storage.get_all_devices_json()
+    
     def get_device(self, mac: str) -> Optional[dict]:
         """Get single device by MAC address"""
         return self.storage.get_device(mac)
@@ -1,16 +1,23 @@
 # network_utils.py
 import os
-import json
 import socket
-import ipaddress
+import struct
 import subprocess
 import logging
+import threading
+import time
+import http.client
 from typing import Optional, Dict, Any, List
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
+from urllib.parse import urlsplit
 
+import orjson
 import psutil
 
+try:
+    import fcntl
+except ImportError:  # Non-Linux dev machines; psutil covers the fallback
+    fcntl = None
+
 # Set up logging with same level configuration as http_server
 def get_log_level():
     """Get log level from environment or default to INFO"""
@@ -20,9 +27,25 @@ def get_log_level():
 logger = logging.getLogger(__name__)
 logger.setLevel(get_log_level())
 
+SIOCGIFADDR = 0x8915
+PROC_NET_ROUTE = "/proc/net/route"
+RTF_UP = 0x0001
+
 SUPERVISOR_BASE = "http://supervisor"
 SUPERVISOR_TOKEN = os.environ.get("SUPERVISOR_TOKEN")
 
+# One kept-alive connection to the Supervisor, shared by all callers
+_SUPERVISOR_CONN: Optional[http.client.HTTPConnection] = None
+_SUPERVISOR_LOCK = threading.Lock()
+
+# get_addon_ip() result cache; the address rarely changes and a lookup can
+# block for seconds on the Supervisor API
+IP_CACHE_TTL = 60.0
+_IP_CACHE = {"ip": None, "ts": 0.0}
+
+# Outward-facing IPv4 from the UDP connect trick, kept once found
+_CONTAINER_IP_CACHE = None
+
 
 # -------------------------
 # Internal helpers (Supervisor)
@@ -35,51 +58,107 @@ def _http_supervisor_get(path: str, timeout: float = 2.0) -> Optional[Dict[str,
         logger.debug("This is expected when running outside Home Assistant environment")
         return None
 
-    url = f"{SUPERVISOR_BASE}{path}"
-    logger.debug(f"Attempting Supervisor API call: {url}")
-    req = Request(url, headers={"Authorization": f"Bearer {SUPERVISOR_TOKEN}"}, method="GET")
+    logger.debug("Attempting Supervisor API call: %s%s", SUPERVISOR_BASE, path)
+    try:
+        status, body = _supervisor_request(path, timeout)
+        if status != 200:
+            logger.warning("Supervisor GET %s returned HTTP %s", path, status)
+            return None
+        # orjson parses the bytes directly; only decode for the debug log
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Supervisor response for %s: %s...", path, body[:300].decode("utf-8", errors="replace"))
+        data = orjson.loads(body)
+        result = data.get("data") if isinstance(data, dict) else None
+        if result is None:
+            logger.warning("Supervisor GET %s had unexpected payload structure", path)
+            if debug:
+                logger.debug("Full response: %s", body.decode("utf-8", errors="replace"))
+        else:
+            logger.debug("Successfully got data from Supervisor %s", path)
+        return result
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        logger.warning("Supervisor GET %s failed: %s: %s", path, type(e).__name__, e)
+        return None
+
+
+def _supervisor_request(path: str, timeout: float):
+    """
+    GET path over the shared keep-alive Supervisor connection.
+
+    Returns (status, body). A connection the Supervisor has closed since the
+    last call is reopened once; any other failure drops the connection so the
+    next call starts fresh.
+    """
+    global _SUPERVISOR_CONN
+    headers = {"Authorization": f"Bearer {SUPERVISOR_TOKEN}"}
+
+    with _SUPERVISOR_LOCK:
+        for attempt in range(2):
+            if _SUPERVISOR_CONN is None:
+                _SUPERVISOR_CONN = http.client.HTTPConnection(urlsplit(SUPERVISOR_BASE).netloc, timeout=timeout)
+            conn = _SUPERVISOR_CONN
+            reused = conn.sock is not None
+            try:
+                if reused:
+                    conn.sock.settimeout(timeout)
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                _SUPERVISOR_CONN = None
+                if not reused or attempt:
+                    raise
+                logger.debug("Supervisor connection was closed, reconnecting")
+            except Exception:
+                conn.close()
+                _SUPERVISOR_CONN = None
+                raise
+
+
+# RFC1918 private networks as (network, mask) 32-bit integers
+_RFC1918_NETS = (
+    (0x0A000000, 0xFF000000),  # 10.0.0.0/8
+    (0xAC100000, 0xFFF00000),  # 172.16.0.0/12
+    (0xC0A80000, 0xFFFF0000),  # 192.168.0.0/16
+)
+
+
+def _ipv4_to_int(ip_str: str) -> Optional[int]:
+    """Parse a dotted-quad IPv4 string to an int; None if it isn't one."""
     try:
-        with urlopen(req, timeout=timeout) as resp:
-            if resp.status != 200:
-                logger.warning(f"Supervisor GET {path} returned HTTP {resp.status}")
-                return None
-            raw = resp.read().decode("utf-8")
-            logger.debug(f"Supervisor response for {path}: {raw[:300]}...")
-            data = json.loads(raw)
-            result = data.get("data") if isinstance(data, dict) else None
-            if result is None:
-                logger.warning(f"Supervisor GET {path} had unexpected payload structure")
-                logger.debug(f"Full response: {raw}")
-            else:
-                logger.debug(f"Successfully got data from Supervisor {path}")
-            return result
-    except (URLError, HTTPError, TimeoutError, ValueError) as e:
-        logger.warning(f"Supervisor GET {path} failed: {type(e).__name__}: {e}")
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip_str), "big")
+    except (OSError, TypeError):
         return None
 
 
+def _is_usable_ipv4(ip_str: str) -> bool:
+    """True for a dotted-quad IPv4 that isn't loopback (127/8) or 0.0.0.0."""
+    ip = _ipv4_to_int(ip_str)
+    return ip is not None and ip != 0 and ip >> 24 != 127
+
+
+def _is_rfc1918(ip: int) -> bool:
+    return any(ip & mask == net for net, mask in _RFC1918_NETS)
+
+
 def _pick_ipv4(addresses: List[str]) -> Optional[str]:
     """
     Given a list of CIDR strings, return a single IPv4 address (no CIDR).
     Prefer RFC1918 private space; else first IPv4.
     """
-    ipv4s: List[ipaddress.IPv4Address] = []
+    first = None
     for cidr in addresses:
-        try:
-            ip_str = cidr.split("/", 1)[0]
-            ip_obj = ipaddress.ip_address(ip_str)
-            if isinstance(ip_obj, ipaddress.IPv4Address):
-                ipv4s.append(ip_obj)
-        except ValueError:
+        ip_str = cidr.split("/", 1)[0]
+        ip = _ipv4_to_int(ip_str)
+        if ip is None:
             continue
-
-    if not ipv4s:
-        return None
-
-    for ip in ipv4s:
-        if ip.is_private:
-            return str(ip)
-    return str(ipv4s[0])
+        if _is_rfc1918(ip):
+            return ip_str
+        if first is None:
+            first = ip_str
+    return first
 
 
 def _get_ipv4_from_default_interface() -> Optional[str]:
@@ -95,7 +174,7 @@ def _get_ipv4_from_default_interface() -> Optional[str]:
     ipv4 = (data.get("ipv4") or {}).get("address") or []
     picked = _pick_ipv4(ipv4)
     if picked:
-        logger.info(f"Supervisor default interface provided IPv4 {picked}")
+        logger.info("Supervisor default interface provided IPv4 %s", picked)
         return picked
 
     logger.debug("Supervisor default interface had no usable IPv4.")
@@ -108,23 +187,25 @@ def _get_ipv4_from_network_info() -> Optional[str]:
     if not data:
         return None
 
-    # First pass: primary+connected
+    # Single pass: a primary+connected iface wins outright; otherwise remember
+    # the first connected iface with an IPv4 as the fallback
+    fallback = None
     for iface in data.get("interfaces", []):
-        if iface.get("primary") and iface.get("connected"):
-            ipv4 = (iface.get("ipv4") or {}).get("address") or []
-            picked = _pick_ipv4(ipv4)
-            if picked:
-                logger.info(f"Supervisor network info picked primary iface {iface.get('interface')} IPv4 {picked}")
-                return picked
-
-    # Second pass: any connected with IPv4
-    for iface in data.get("interfaces", []):
-        if iface.get("connected"):
-            ipv4 = (iface.get("ipv4") or {}).get("address") or []
-            picked = _pick_ipv4(ipv4)
-            if picked:
-                logger.info(f"Supervisor network info picked connected iface {iface.get('interface')} IPv4 {picked}")
-                return picked
+        if not iface.get("connected"):
+            continue
+        ipv4 = (iface.get("ipv4") or {}).get("address") or []
+        picked = _pick_ipv4(ipv4)
+        if not picked:
+            continue
+        if iface.get("primary"):
+            logger.info("Supervisor network info picked primary iface %s IPv4 %s", iface.get('interface'), picked)
+            return picked
+        if fallback is None:
+            fallback = (iface.get("interface"), picked)
+
+    if fallback:
+        logger.info("Supervisor network info picked connected iface %s IPv4 %s", fallback[0], fallback[1])
+        return fallback[1]
 
     logger.debug("Supervisor network info had no usable connected IPv4.")
     return None
@@ -139,51 +220,106 @@ def _container_guess_ipv4() -> Optional[str]:
     Try to infer an outward-facing IPv4 from inside the container.
     This is deliberately last-resort behind Supervisor truth.
     """
+    global _CONTAINER_IP_CACHE
+    if _CONTAINER_IP_CACHE is not None:
+        logger.warning("Falling back to container IPv4 guess via UDP connect: %s", _CONTAINER_IP_CACHE)
+        return _CONTAINER_IP_CACHE
+
     # UDP "connect" trick—no packets need to be sent
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
             s.connect(("1.1.1.1", 53))
             ip = s.getsockname()[0]
-            ip_obj = ipaddress.ip_address(ip)
-            if isinstance(ip_obj, ipaddress.IPv4Address):
-                logger.warning(f"Falling back to container IPv4 guess via UDP connect: {ip}")
+            if _is_usable_ipv4(ip):
+                _CONTAINER_IP_CACHE = ip
+                logger.warning("Falling back to container IPv4 guess via UDP connect: %s", ip)
                 return ip
     except Exception as e:
-        logger.debug(f"Container UDP connect trick failed: {e}")
+        logger.debug("Container UDP connect trick failed: %s", e)
 
     # Scan interfaces; prefer private IPv4
     try:
-        for name, addrs in psutil.net_if_addrs().items():
-            for a in addrs:
-                if a.family == socket.AF_INET:
-                    try:
-                        ip_obj = ipaddress.ip_address(a.address)
-                        if isinstance(ip_obj, ipaddress.IPv4Address) and ip_obj.is_private:
-                            logger.warning(f"Falling back to container interface {name} IPv4 {a.address}")
-                            return a.address
-                    except ValueError:
-                        continue
+        for name, address in _interface_ipv4_addresses():
+            ip = _ipv4_to_int(address)
+            if ip is not None and _is_rfc1918(ip):
+                logger.warning("Falling back to container interface %s IPv4 %s", name, address)
+                return address
     except Exception as e:
-        logger.debug(f"Container interface scan failed: {e}")
+        logger.debug("Container interface scan failed: %s", e)
 
     return None
 
 
+def _interface_ipv4_addresses() -> List[tuple]:
+    """
+    (interface, IPv4) pairs for the container's interfaces.
+
+    Uses one SIOCGIFADDR ioctl per interface on Linux, which returns just the
+    IPv4 address; psutil (every address family, one namedtuple per address)
+    is only used where fcntl isn't available.
+    """
+    if fcntl is None:
+        return [
+            (name, a.address)
+            for name, addrs in psutil.net_if_addrs().items()
+            for a in addrs
+            if a.family == socket.AF_INET
+        ]
+
+    pairs = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for _, name in socket.if_nameindex():
+            try:
+                ifreq = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack("256s", name[:15].encode()))
+            except OSError:
+                continue  # Interface has no IPv4 address
+            pairs.append((name, socket.inet_ntoa(ifreq[20:24])))
+    return pairs
+
+
 # -------------------------
 # Public API
 # -------------------------
 
-def get_addon_ip() -> str:
+def get_addon_ip(force: bool = False) -> str:
     """
     Robust IPv4 for LAN clients (bulbs). Prefers Supervisor's view of the host.
+    
+    The result is cached for IP_CACHE_TTL seconds; pass force=True to bypass
+    the cache (e.g. after a connection failure).
     """
+    global _CONTAINER_IP_CACHE
+    now = time.monotonic()
+    if not force and _IP_CACHE["ip"] is not None and now - _IP_CACHE["ts"] < IP_CACHE_TTL:
+        return _IP_CACHE["ip"]
+    
+    if force:
+        # The UDP fallback address may be the one that moved
+        _CONTAINER_IP_CACHE = None
+    
+    ip = _detect_addon_ip()
+    _IP_CACHE["ip"] = ip
+    _IP_CACHE["ts"] = now
+    return ip
+
+
+def invalidate_ip_cache() -> None:
+    """Forget every cached address so the next get_addon_ip() re-detects."""
+    global _CONTAINER_IP_CACHE
+    _IP_CACHE["ip"] = None
+    _IP_CACHE["ts"] = 0.0
+    _CONTAINER_IP_CACHE = None
+
+
+def _detect_addon_ip() -> str:
+    """Run the Supervisor / container detection chain (uncached)."""
     logger.debug("=== Starting IP detection process ===")
     
     # 1) Preferred: default interface
     logger.debug("Step 1: Trying Supervisor default interface...")
     ip = _get_ipv4_from_default_interface()
     if ip:
-        logger.info(f"✓ Using Supervisor default interface IP: {ip}")
+        logger.info("✓ Using Supervisor default interface IP: %s", ip)
         return ip
     logger.debug("Step 1 failed: No IP from default interface")
 
@@ -191,7 +327,7 @@ def get_addon_ip() -> str:
     logger.debug("Step 2: Trying Supervisor network info scan...")
     ip = _get_ipv4_from_network_info()
     if ip:
-        logger.info(f"✓ Using Supervisor network scan IP: {ip}")
+        logger.info("✓ Using Supervisor network scan IP: %s", ip)
         return ip
     logger.debug("Step 2 failed: No IP from network info")
 
@@ -199,7 +335,7 @@ def get_addon_ip() -> str:
     logger.debug("Step 3: Falling back to container heuristics...")
     ip = _container_guess_ipv4()
     if ip:
-        logger.info(f"✓ Using container-detected IP: {ip}")
+        logger.info("✓ Using container-detected IP: %s", ip)
         return ip
     logger.debug("Step 3 failed: Container heuristics failed")
 
@@ -207,6 +343,42 @@ def get_addon_ip() -> str:
     return "0.0.0.0"
 
 
+def _hex_to_ipv4(value: str) -> str:
+    """Convert a /proc/net/route address (little-endian hex) to dotted quad."""
+    return socket.inet_ntoa(struct.pack("<I", int(value, 16)))
+
+
+def _read_proc_routes() -> List[str]:
+    """
+    Read the IPv4 routing table from /proc/net/route (no fork/exec) and render
+    each entry in roughly the same shape as `ip route show`.
+    """
+    routes = []
+    with open(PROC_NET_ROUTE) as f:
+        lines = f.read().splitlines()[1:]  # Skip header
+
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        iface, dest, gateway, flags, metric, mask = (
+            fields[0], fields[1], fields[2], int(fields[3], 16), int(fields[6]), fields[7]
+        )
+        if not flags & RTF_UP:
+            continue
+
+        prefix = bin(int(mask, 16)).count("1")
+        route = "default" if prefix == 0 else f"{_hex_to_ipv4(dest)}/{prefix}"
+        if int(gateway, 16):
+            route += f" via {_hex_to_ipv4(gateway)}"
+        route += f" dev {iface}"
+        if metric:
+            route += f" metric {metric}"
+        routes.append(route)
+
+    return routes
+
+
 def get_network_info() -> dict:
     """
     Container-centric diagnostics for add-on UI:
@@ -233,21 +405,30 @@ def get_network_info() -> dict:
                         "netmask": addr.netmask,
                         "broadcast": addr.broadcast
                     })
-        logger.debug(f"Collected {len(info['interfaces'])} interfaces from container view.")
+        logger.debug("Collected %d interfaces from container view.", len(info['interfaces']))
     except Exception as e:
-        logger.error(f"Failed to get interface info: {e}")
+        logger.error("Failed to get interface info: %s", e)
 
     # Routing (container view)
+    try:
+        info["routes"] = _read_proc_routes()
+        logger.debug("Collected %d routes from %s.", len(info['routes']), PROC_NET_ROUTE)
+        return info
+    except FileNotFoundError:
+        logger.debug("%s not available, falling back to 'ip route show'", PROC_NET_ROUTE)
+    except Exception as e:
+        logger.debug("Failed to read %s: %s", PROC_NET_ROUTE, e)
+
     try:
         result = subprocess.run(
             ["ip", "route", "show"], capture_output=True, text=True, timeout=5
         )
         if result.returncode == 0:
             info["routes"] = [line for line in result.stdout.strip().split("\n") if line]
-            logger.debug(f"Collected {len(info['routes'])} routes from container view.")
+            logger.debug("Collected %d routes from container view.", len(info['routes']))
         else:
-            logger.debug(f"'ip route show' returned code {result.returncode}: {result.stderr.strip()}")
+            logger.debug("'ip route show' returned code %d: %s", result.returncode, result.stderr.strip())
     except Exception as e:
-        logger.debug(f"Failed to get route info: {e}")
+        logger.debug("Failed to get route info: %s", e)
 
     return info
@@ -6,16 +6,19 @@ Serves the two critical endpoints bulbs need during setup
 No async, no middleware magic, just plain HTTP handling.
 What you see is what you get.
 """
-import json
 import os
+import signal
 import time
 import logging
+import queue
+import threading
 from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
-from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import OrderedDict
 
-from network_utils import get_addon_ip, get_network_info
+import orjson
+
+from network_utils import get_addon_ip, get_network_info, invalidate_ip_cache
 from mqtt_listener import SengledMQTTListener
 
 # Configure logging with environment variable support
@@ -34,9 +37,9 @@ logger = logging.getLogger(__name__)
 CONFIG = {
     'mqtt_port': 28527,
     'http_port': 54448,
-    'cached_ip': None,
     'ip_cache_duration': 300,  # 5 minutes
-    'last_ip_check': 0
+    'last_ip_check': 0,  # time.time() of the last refresh, for display only
+    'max_tracked_clients': 1024  # Oldest clients are forgotten beyond this
 }
 
 # Statistics tracking  
@@ -45,111 +48,310 @@ STATS = {
     'bimqtt_requests': 0,
     'access_cloud_requests': 0,
     'total_requests': 0,
-    'last_request': None,
-    'client_ips': set(),
-    'client_request_counts': defaultdict(int)
+    'last_request': None,  # time.time() of the latest request, formatted on read
+    'client_ips': OrderedDict()  # Bounded LRU of recent client IP -> request count
 }
 
 # Global MQTT listener instance
 mqtt_listener = None
 
+# HTTP version spoken by SengledHandler, also used by pre-built responses;
+# 1.1 keeps connections open between requests, so every response must
+# carry a Content-Length
+PROTOCOL_VERSION = "HTTP/1.1"
+
+# CORS headers sent on every response
+CORS_HEADERS = (
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+    b"Access-Control-Allow-Headers: *\r\n"
+)
+
+def build_json_response(body):
+    """Encode a complete 200 response (status line, headers and body) for a fixed JSON body
+    
+    The Date header is left out so the bytes can be reused across requests.
+    """
+    server = f"{BaseHTTPRequestHandler.server_version} {BaseHTTPRequestHandler.sys_version}"
+    head = (f"{PROTOCOL_VERSION} 200 OK\r\n"
+            f"Server: {server}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n").encode('latin-1')
+    return head + CORS_HEADERS + b"\r\n" + body
+
+# /accessCloud.json never changes, so its whole response is encoded once
+ACCESS_CLOUD_RESPONSE = build_json_response(orjson.dumps({
+    "messageCode": "200",
+    "info": "OK",
+    "description": "正常",
+    "success": True
+}))
+
+# Dashboard page, split so only the stats and endpoints are formatted per request;
+# the head (with its CSS) and the tail are encoded once
+DASHBOARD_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+    <title>Sengled Local Server</title>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
+        .container { max-width: 800px; margin: 0 auto; background: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        .header { text-align: center; margin-bottom: 30px; }
+        .status { display: flex; justify-content: space-between; margin: 20px 0; }
+        .stat-box { background: #e8f4fd; padding: 15px; border-radius: 5px; text-align: center; flex: 1; margin: 0 10px; }
+        .endpoints { background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        .endpoint { margin: 10px 0; font-family: monospace; }
+        .green { color: #28a745; }
+        .red { color: #dc3545; }
+        .blue { color: #007bff; }
+        .footer { text-align: center; margin-top: 30px; color: #666; font-size: 14px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🔦 Sengled Local Server 💡</h1>
+            <p class="green">Status: Running (Simple HTTP)</p>
+        </div>
+        
+""".encode('utf-8')
+
+DASHBOARD_TEMPLATE = """        <div class="status">
+            <div class="stat-box">
+                <h3>HTTP Uptime</h3>
+                <p>{http_uptime}</p>
+            </div>
+            <div class="stat-box">
+                <h3>Total Requests</h3>
+                <p>{total_requests}</p>
+            </div>
+            <div class="stat-box">
+                <h3>Discovered Devices</h3>
+                <p>{device_count}</p>
+            </div>
+            <div class="stat-box">
+                <h3>MQTT Status</h3>
+                <p class="{mqtt_status_class}">{mqtt_status}</p>
+            </div>
+        </div>
+        
+        <div class="endpoints">
+            <h3>📡 Active Endpoints</h3>
+            <div class="endpoint"><strong>MQTT Info:</strong> <span class="blue">http://{current_ip}:{http_port}/bimqtt</span></div>
+            <div class="endpoint"><strong>Cloud Access:</strong> <span class="blue">http://{current_ip}:{http_port}/accessCloud.json</span></div>
+            <div class="endpoint"><strong>MQTT Broker:</strong> <span class="blue">{current_ip}:{mqtt_port}</span> (SSL)</div>
+        </div>
+        
+"""
+
+DASHBOARD_TAIL = """        <div class="endpoints">
+            <h3>🔧 Management & API</h3>
+            <div class="endpoint"><a href="/status">📊 Detailed Status</a></div>
+            <div class="endpoint"><a href="/network">🌐 Network Info</a></div>
+            <div class="endpoint"><a href="/health">❤️ Health Check</a></div>
+            <div class="endpoint"><a href="/api/devices">📱 Device API</a></div>
+            <div class="endpoint"><a href="/api/mqtt/status">📡 MQTT Status</a></div>
+        </div>
+        
+        <div class="footer">
+            <p>Sengled Local Server v1.0.11 - Simple HTTP | Keeping your bulbs local! 🏠</p>
+        </div>
+    </div>
+</body>
+</html>
+""".encode('utf-8')
+
+# get_current_ip() cache; plain globals so the fast path is a single compare
+_CACHED_IP = None
+_CACHED_IP_EXPIRES = 0.0  # time.monotonic() deadline; 0 forces a refresh
+_BIMQTT_RESPONSE = None  # Pre-rendered /bimqtt response for _CACHED_IP
+
 def get_current_ip():
     """Get current IP with caching to avoid excessive lookups"""
-    current_time = time.time()
+    global _CACHED_IP, _CACHED_IP_EXPIRES, _BIMQTT_RESPONSE
+    now = time.monotonic()
+    if now < _CACHED_IP_EXPIRES:
+        return _CACHED_IP
     
-    if (CONFIG['cached_ip'] is None or 
-        current_time - CONFIG['last_ip_check'] > CONFIG['ip_cache_duration']):
-        
-        CONFIG['cached_ip'] = get_addon_ip()
-        CONFIG['last_ip_check'] = current_time
-        logger.info(f"Refreshed cached IP: {CONFIG['cached_ip']}")
+    ip = get_addon_ip()
+    # The bimqtt answer only depends on the IP, so render it with each refresh
+    bimqtt_response = build_json_response(orjson.dumps({
+        "protocal": "mqtt",  # Intentional typo - matches Sengled firmware
+        "host": ip,
+        "port": CONFIG['mqtt_port']
+    }))
+    # Publish the response before the IP so concurrent requests that see
+    # the new IP never serve the old one
+    _BIMQTT_RESPONSE = bimqtt_response
+    _CACHED_IP = ip
+    _CACHED_IP_EXPIRES = now + CONFIG['ip_cache_duration']
+    CONFIG['last_ip_check'] = time.time()
+    logger.info("Refreshed cached IP: %s", ip)
+    return ip
+
+# Last formatted uptime as (whole seconds, text); the text only changes once a second
+_UPTIME_TEXT = (None, '')
+
+def format_uptime(seconds):
+    """Format an uptime as '1h 2m 3s'"""
+    global _UPTIME_TEXT
+    whole = int(seconds)
+    cached_whole, text = _UPTIME_TEXT
+    if whole != cached_whole:
+        hours, rest = divmod(whole, 3600)
+        minutes, secs = divmod(rest, 60)
+        text = f"{hours}h {minutes}m {secs}s"
+        _UPTIME_TEXT = (whole, text)
+    return text
+
+# Paths bulbs are known to send, mapped straight to their endpoint
+_KNOWN_PATHS = {
+    '/bimqtt': '/bimqtt',
+    'bimqtt': '/bimqtt',
+    '//bimqtt': '/bimqtt',
+    '/accessCloud.json': '/accessCloud.json',
+    'accessCloud.json': '/accessCloud.json',
+    '//accessCloud.json': '/accessCloud.json',
+    '/accesscloud.json': '/accessCloud.json',
+}
+
+def _canonical_path(raw_path):
+    """Map the many mangled forms bulbs request onto their real endpoint
+    
+    Firmware sends things like //bimqtt, /bimqtt?x=y or a full URL as the
+    path. The common forms are a dict lookup; anything else is matched by
+    substring on a single lowercased copy.
+    """
+    known = _KNOWN_PATHS.get(raw_path)
+    if known is not None:
+        return known
+    lowered = raw_path.lower()
+    if 'bimqtt' in lowered:
+        return '/bimqtt'
+    if 'accesscloud' in lowered:
+        return '/accessCloud.json'
+    return raw_path
+
+# Requests waiting to be counted and logged; handlers only enqueue, so the
+# bookkeeping and log I/O stay off the response path. The stats thread is
+# the only writer of STATS, so no lock is needed.
+_STATS_QUEUE = queue.SimpleQueue()
+
+def _record_request(client_ip, command, path, now, counter):
+    """Update request statistics and detect repeated requests
+    
+    counter names an extra STATS entry to bump for this request, if any.
+    """
+    STATS['total_requests'] += 1
+    STATS['last_request'] = now
+    if counter is not None:
+        STATS[counter] += 1
     
-    return CONFIG['cached_ip']
+    # Count and recency live in one LRU, so forgetting a client
+    # drops its count too
+    client_ips = STATS['client_ips']
+    count = client_ips.get(client_ip, 0) + 1
+    client_ips[client_ip] = count
+    client_ips.move_to_end(client_ip)
+    if len(client_ips) > CONFIG['max_tracked_clients']:
+        client_ips.popitem(last=False)
+    
+    # Log the raw path exactly as received - this is what we need to debug!
+    logger.info("Request from %s: %s %s", client_ip, command, path)
+    
+    # Check for repeated bimqtt requests (indicates MQTT connection issues);
+    # match the way routing does so /BIMQTT and friends count too
+    if _canonical_path(path) == '/bimqtt':
+        if count > 3:  # More than 3 requests from same client
+            logger.warning("⚠️  Client %s has made %d requests - likely MQTT connection issues!", client_ip, count)
+            logger.warning("   This usually means the bulb can't connect to MQTT broker on port 28527")
+
+def _stats_loop():
+    """Drain the request queue for the life of the process"""
+    while True:
+        try:
+            _record_request(*_STATS_QUEUE.get())
+        except Exception as e:
+            logger.error("Failed to record request: %s", e)
+
+def start_stats_thread():
+    """Start the background thread that records queued requests"""
+    threading.Thread(target=_stats_loop, name="request-stats", daemon=True).start()
 
 class SengledHandler(BaseHTTPRequestHandler):
     """HTTP request handler for Sengled bulb endpoints"""
     
+    protocol_version = PROTOCOL_VERSION
+    # Send small responses immediately instead of waiting on Nagle/delayed ACK
+    disable_nagle_algorithm = True
+    # Close idle keep-alive connections so they don't hold a thread forever
+    timeout = 30
+    
     def log_message(self, format, *args):
         """Override to use our logger instead of stderr"""
-        logger.debug(format % args)
+        logger.debug(format, *args)
+    
+    def send_json_response(self, data, status=200, pretty=True):
+        """Send JSON response with proper headers
+        
+        Endpoints read by bulbs or scripts pass pretty=False for compact output.
+        """
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        self.send_json_bytes(orjson.dumps(data, option=option), status)
     
-    def send_cors_headers(self):
-        """Add CORS headers for wide compatibility"""
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', '*')
+    def send_json_bytes(self, json_data, status=200):
+        """Send an already-encoded JSON body with proper headers"""
+        self.wfile.write(self.response_head(status, 'application/json', len(json_data)) + json_data)
     
-    def send_json_response(self, data, status=200):
-        """Send JSON response with proper headers"""
-        json_data = json.dumps(data, indent=2)
+    def response_head(self, status, content_type, length):
+        """Encode the status line and headers in one go so a response is a single write
         
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', str(len(json_data)))
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json_data.encode('utf-8'))
-    
-    def send_html_response(self, html, status=200):
-        """Send HTML response with proper headers"""
-        self.send_response(status)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.send_header('Content-Length', str(len(html)))
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(html.encode('utf-8'))
+        Same headers as send_response() plus our content and CORS headers;
+        content_type=None leaves out Content-Type for bodiless responses.
+        """
+        self.log_request(status)
+        phrase = self.responses[status][0] if status in self.responses else ''
+        content_type_line = f"Content-Type: {content_type}\r\n" if content_type is not None else ""
+        return (f"{self.protocol_version} {status} {phrase}\r\n"
+                f"Server: {self.version_string()}\r\n"
+                f"Date: {self.date_time_string()}\r\n"
+                f"{content_type_line}"
+                f"Content-Length: {length}\r\n").encode('latin-1') + CORS_HEADERS + b"\r\n"
+    
+    def send_prebuilt_response(self, response, status=200):
+        """Send a complete response from build_json_response() in one write"""
+        self.log_request(status)
+        self.wfile.write(response)
+    
+    def send_html_bytes(self, body, status=200):
+        """Send an already-encoded HTML body with proper headers"""
+        self.wfile.write(self.response_head(status, 'text/html; charset=utf-8', len(body)) + body)
     
     def track_request(self):
-        """Track request statistics and detect repeated requests"""
-        client_ip = self.client_address[0]
-        
-        # Update general stats
-        STATS['total_requests'] += 1
-        STATS['last_request'] = datetime.now().isoformat()
-        STATS['client_ips'].add(client_ip)
-        STATS['client_request_counts'][client_ip] += 1
-        
-        # Log the raw path exactly as received - this is what we need to debug!
-        logger.info(f"Request from {client_ip}: {self.command} {self.path}")
-        
-        # Check for repeated bimqtt requests (indicates MQTT connection issues)
-        if 'bimqtt' in self.path:
-            count = STATS['client_request_counts'][client_ip]
-            if count > 3:  # More than 3 requests from same client
-                logger.warning(f"⚠️  Client {client_ip} has made {count} requests - likely MQTT connection issues!")
-                logger.warning("   This usually means the bulb can't connect to MQTT broker on port 28527")
+        """Queue this request for the stats thread to count and log"""
+        _STATS_QUEUE.put((self.client_address[0], self.command, self.path, self._now, self._counter))
     
     def handle_bimqtt(self):
         """Handle MQTT broker information request"""
-        STATS['bimqtt_requests'] += 1
+        self._counter = 'bimqtt_requests'
         current_ip = get_current_ip()
         
-        response_data = {
-            "protocal": "mqtt",  # Intentional typo - matches Sengled firmware
-            "host": current_ip,
-            "port": CONFIG['mqtt_port']
-        }
-        
-        logger.info(f"📡 Serving bimqtt to {self.client_address[0]}: {response_data}")
-        self.send_json_response(response_data)
+        logger.info("📡 Serving bimqtt to %s: host=%s port=%d",
+                    self.client_address[0], current_ip, CONFIG['mqtt_port'])
+        self.send_prebuilt_response(_BIMQTT_RESPONSE)
     
     def handle_access_cloud(self):
         """Handle cloud access status request"""
-        STATS['access_cloud_requests'] += 1
+        self._counter = 'access_cloud_requests'
         
-        response_data = {
-            "messageCode": "200",
-            "info": "OK",
-            "description": "正常",
-            "success": True
-        }
-        
-        logger.info(f"☁️  Serving accessCloud.json to {self.client_address[0]}")
-        self.send_json_response(response_data)
+        logger.info("☁️  Serving accessCloud.json to %s", self.client_address[0])
+        self.send_prebuilt_response(ACCESS_CLOUD_RESPONSE)
     
     def handle_health(self):
         """Health check endpoint"""
-        uptime = time.time() - STATS['start_time']
+        uptime = self._now - STATS['start_time']
         
         response_data = {
             "status": "healthy",
@@ -162,7 +364,7 @@ class SengledHandler(BaseHTTPRequestHandler):
     
     def handle_status(self):
         """Detailed status endpoint with statistics"""
-        uptime = time.time() - STATS['start_time']
+        uptime = self._now - STATS['start_time']
         current_ip = get_current_ip()
         
         response_data = {
@@ -170,7 +372,7 @@ class SengledHandler(BaseHTTPRequestHandler):
             "version": "1.0.11",
             "status": "running",
             "uptime_seconds": round(uptime, 2),
-            "uptime_human": f"{int(uptime // 3600)}h {int((uptime % 3600) // 60)}m {int(uptime % 60)}s",
+            "uptime_human": format_uptime(uptime),
             "current_ip": current_ip,
             "ports": {
                 "http": CONFIG['http_port'],
@@ -181,7 +383,8 @@ class SengledHandler(BaseHTTPRequestHandler):
                 "bimqtt_requests": STATS['bimqtt_requests'],
                 "access_cloud_requests": STATS['access_cloud_requests'],
                 "unique_clients": len(STATS['client_ips']),
-                "last_request": STATS['last_request']
+                "last_request": (datetime.fromtimestamp(STATS['last_request']).isoformat()
+                                 if STATS['last_request'] else None)
             },
             "endpoints": {
                 "bimqtt": f"http://{current_ip}:{CONFIG['http_port']}/bimqtt",
@@ -199,14 +402,14 @@ class SengledHandler(BaseHTTPRequestHandler):
                 "success": True,
                 "network_info": network_info,
                 "cache_info": {
-                    "cached_ip": CONFIG['cached_ip'],
+                    "cached_ip": _CACHED_IP,
                     "last_check": CONFIG['last_ip_check'],
                     "cache_duration": CONFIG['ip_cache_duration']
                 }
             }
             self.send_json_response(response_data)
         except Exception as e:
-            logger.error(f"Failed to get network info: {e}")
+            logger.error("Failed to get network info: %s", e)
             self.send_json_response({"success": False, "error": str(e)}, status=500)
     
     def handle_api_devices(self):
@@ -221,19 +424,20 @@ class SengledHandler(BaseHTTPRequestHandler):
                 }, status=503)
                 return
             
-            devices = mqtt_listener.get_devices()
+            # Devices come back already encoded, so they are embedded as-is
+            # instead of being re-serialized
+            devices = mqtt_listener.get_devices_json()
             
-            response_data = {
+            self.send_json_bytes(orjson.dumps({
                 "success": True,
                 "device_count": len(devices),
-                "devices": devices
-            }
+                "devices": {mac: orjson.Fragment(data) for mac, data in devices.items()}
+            }))
             
-            logger.info(f"📱 API: Served {len(devices)} devices to {self.client_address[0]}")
-            self.send_json_response(response_data)
+            logger.info("📱 API: Served %d devices to %s", len(devices), self.client_address[0])
             
         except Exception as e:
-            logger.error(f"Failed to get devices: {e}")
+            logger.error("Failed to get devices: %s", e)
             self.send_json_response({
                 "success": False, 
                 "error": str(e)
@@ -265,11 +469,11 @@ class SengledHandler(BaseHTTPRequestHandler):
                 "device": device
             }
             
-            logger.info(f"📱 API: Served device {mac} to {self.client_address[0]}")
-            self.send_json_response(response_data)
+            logger.info("📱 API: Served device %s to %s", mac, self.client_address[0])
+            self.send_json_response(response_data, pretty=False)
             
         except Exception as e:
-            logger.error(f"Failed to get device {mac}: {e}")
+            logger.error("Failed to get device %s: %s", mac, e)
             self.send_json_response({
                 "success": False,
                 "error": str(e)
@@ -297,7 +501,7 @@ class SengledHandler(BaseHTTPRequestHandler):
             self.send_json_response(response_data)
             
         except Exception as e:
-            logger.error(f"Failed to get MQTT status: {e}")
+            logger.error("Failed to get MQTT status: %s", e)
             self.send_json_response({
                 "success": False,
                 "error": str(e)
@@ -307,186 +511,147 @@ class SengledHandler(BaseHTTPRequestHandler):
         """Simple HTML dashboard"""
         global mqtt_listener
         
-        uptime = time.time() - STATS['start_time']
+        uptime = self._now - STATS['start_time']
         current_ip = get_current_ip()
         
         # Get MQTT and device info
         mqtt_status = "Disconnected"
         device_count = 0
-        mqtt_uptime = "N/A"
         
         if mqtt_listener:
             status = mqtt_listener.get_status()
             mqtt_status = "Connected" if status['connected'] else "Disconnected"
             device_count = status['storage']['total_devices']
-            mqtt_uptime = f"{int(status['uptime_seconds'] // 3600)}h {int((status['uptime_seconds'] % 3600) // 60)}m {int(status['uptime_seconds'] % 60)}s"
-        
-        html_content = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Sengled Local Server</title>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1">
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }}
-        .container {{ max-width: 800px; margin: 0 auto; background: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-        .header {{ text-align: center; margin-bottom: 30px; }}
-        .status {{ display: flex; justify-content: space-between; margin: 20px 0; }}
-        .stat-box {{ background: #e8f4fd; padding: 15px; border-radius: 5px; text-align: center; flex: 1; margin: 0 10px; }}
-        .endpoints {{ background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-        .endpoint {{ margin: 10px 0; font-family: monospace; }}
-        .green {{ color: #28a745; }}
-        .red {{ color: #dc3545; }}
-        .blue {{ color: #007bff; }}
-        .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 14px; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🔦 Sengled Local Server 💡</h1>
-            <p class="green">Status: Running (Simple HTTP)</p>
-        </div>
-        
-        <div class="status">
-            <div class="stat-box">
-                <h3>HTTP Uptime</h3>
-                <p>{int(uptime // 3600)}h {int((uptime % 3600) // 60)}m {int(uptime % 60)}s</p>
-            </div>
-            <div class="stat-box">
-                <h3>Total Requests</h3>
-                <p>{STATS['total_requests']}</p>
-            </div>
-            <div class="stat-box">
-                <h3>Discovered Devices</h3>
-                <p>{device_count}</p>
-            </div>
-            <div class="stat-box">
-                <h3>MQTT Status</h3>
-                <p class="{'green' if mqtt_status == 'Connected' else 'red'}">{mqtt_status}</p>
-            </div>
-        </div>
-        
-        <div class="endpoints">
-            <h3>📡 Active Endpoints</h3>
-            <div class="endpoint"><strong>MQTT Info:</strong> <span class="blue">http://{current_ip}:{CONFIG['http_port']}/bimqtt</span></div>
-            <div class="endpoint"><strong>Cloud Access:</strong> <span class="blue">http://{current_ip}:{CONFIG['http_port']}/accessCloud.json</span></div>
-            <div class="endpoint"><strong>MQTT Broker:</strong> <span class="blue">{current_ip}:{CONFIG['mqtt_port']}</span> (SSL)</div>
-        </div>
-        
-        <div class="endpoints">
-            <h3>🔧 Management & API</h3>
-            <div class="endpoint"><a href="/status">📊 Detailed Status</a></div>
-            <div class="endpoint"><a href="/network">🌐 Network Info</a></div>
-            <div class="endpoint"><a href="/health">❤️ Health Check</a></div>
-            <div class="endpoint"><a href="/api/devices">📱 Device API</a></div>
-            <div class="endpoint"><a href="/api/mqtt/status">📡 MQTT Status</a></div>
-        </div>
-        
-        <div class="footer">
-            <p>Sengled Local Server v1.0.11 - Simple HTTP | Keeping your bulbs local! 🏠</p>
-        </div>
-    </div>
-</body>
-</html>
-        """
         
-        self.send_html_response(html_content)
+        stats_html = DASHBOARD_TEMPLATE.format(
+            http_uptime=format_uptime(uptime),
+            total_requests=STATS['total_requests'],
+            device_count=device_count,
+            mqtt_status=mqtt_status,
+            mqtt_status_class='green' if mqtt_status == 'Connected' else 'red',
+            current_ip=current_ip,
+            http_port=CONFIG['http_port'],
+            mqtt_port=CONFIG['mqtt_port'],
+        )
+        
+        self.send_html_bytes(b"".join((DASHBOARD_HEAD, stats_html.encode('utf-8'), DASHBOARD_TAIL)))
+    
+    # Exact GET paths; bulb variants are resolved through _canonical_path()
+    _GET_ROUTES = {
+        '/bimqtt': handle_bimqtt,
+        '/accessCloud.json': handle_access_cloud,
+        '/api/devices': handle_api_devices,
+        '/api/mqtt/status': handle_api_mqtt_status,
+        '/health': handle_health,
+        '/status': handle_status,
+        '/network': handle_network,
+        '/': handle_dashboard,
+        '': handle_dashboard,
+    }
     
     def do_GET(self):
         """Handle GET requests - this is where all the URL magic happens"""
-        start_time = time.time()
-        
-        # Track the request
-        self.track_request()
+        # One clock read per request, shared by stats, IP cache and uptimes
+        self._now = time.time()
+        # Endpoint counter set by the handler, reported with the request
+        self._counter = None
+        debug = logger.isEnabledFor(logging.DEBUG)
         
         # The path as received - no processing, no interpretation
         raw_path = self.path
         
-        # Handle all the crazy ways the bulbs might send requests
-        # Check for bimqtt in any form
-        if any(pattern in raw_path for pattern in ['/bimqtt', 'bimqtt']):
-            self.handle_bimqtt()
-        
-        # Check for accessCloud in any form  
-        elif any(pattern in raw_path for pattern in ['/accessCloud.json', 'accessCloud.json', 'accessCloud']):
-            self.handle_access_cloud()
-        
-        # API endpoints for device management
-        elif raw_path == '/api/devices':
-            self.handle_api_devices()
-        elif raw_path.startswith('/api/device/'):
-            # Extract MAC from path like /api/device/B0:CE:18:C3:3A:A2
-            mac = raw_path.split('/')[-1]
-            self.handle_api_device(mac)
-        elif raw_path == '/api/mqtt/status':
-            self.handle_api_mqtt_status()
-        
-        # Management endpoints
-        elif raw_path == '/health':
-            self.handle_health()
-        elif raw_path == '/status':
-            self.handle_status()
-        elif raw_path == '/network':
-            self.handle_network()
-        elif raw_path == '/' or raw_path == '':
-            self.handle_dashboard()
-        
-        # 404 for anything else
-        else:
-            logger.warning(f"🚫 404 Not Found: {raw_path}")
-            self.send_json_response({"error": "Not Found", "path": raw_path}, status=404)
+        try:
+            # Exact paths first, then all the crazy ways the bulbs might send requests
+            route = self._GET_ROUTES.get(raw_path)
+            if route is None:
+                route = self._GET_ROUTES.get(_canonical_path(raw_path))
+            if route is not None:
+                route(self)
+            
+            # API endpoint for a single device
+            elif raw_path.startswith('/api/device/'):
+                # Extract MAC from path like /api/device/B0:CE:18:C3:3A:A2
+                mac = raw_path.rpartition('/')[2]
+                self.handle_api_device(mac)
+            
+            # 404 for anything else
+            else:
+                logger.warning("🚫 404 Not Found: %s", raw_path)
+                self.send_json_response({"error": "Not Found", "path": raw_path}, status=404)
+        finally:
+            # Track the request once the response is on its way
+            self.track_request()
         
         # Log processing time
-        process_time = time.time() - start_time
-        logger.debug(f"Request processed in {process_time:.3f}s")
+        if debug:
+            logger.debug("Request processed in %.3fs", time.time() - self._now)
     
     def do_POST(self):
         """Handle POST requests"""
-        start_time = time.time()
-        
-        # Track the request
-        self.track_request()
+        self._now = time.time()
+        self._counter = None
+        debug = logger.isEnabledFor(logging.DEBUG)
         
         raw_path = self.path
         
-        # Read POST data (but usually ignore it for Sengled endpoints)
-        content_length = int(self.headers.get('Content-Length', 0))
-        if content_length > 0:
-            post_data = self.rfile.read(content_length)
-            logger.debug(f"POST data received ({content_length} bytes): {post_data[:200]}...")
-        
-        # Handle POST to accessCloud
-        if any(pattern in raw_path for pattern in ['/accessCloud.json', 'accessCloud.json', 'accessCloud']):
-            self.handle_access_cloud()
-        else:
-            logger.warning(f"🚫 POST 404 Not Found: {raw_path}")
-            self.send_json_response({"error": "Not Found", "path": raw_path}, status=404)
+        try:
+            # Read POST data (but usually ignore it for Sengled endpoints)
+            content_length = int(self.headers.get('Content-Length', 0))
+            if content_length > 0:
+                post_data = self.rfile.read(content_length)
+                if debug:
+                    logger.debug("POST data received (%d bytes): %s...", content_length, post_data[:200])
+            
+            # Handle POST to accessCloud
+            if _canonical_path(raw_path) == '/accessCloud.json':
+                self.handle_access_cloud()
+            else:
+                logger.warning("🚫 POST 404 Not Found: %s", raw_path)
+                self.send_json_response({"error": "Not Found", "path": raw_path}, status=404)
+        finally:
+            # Track the request once the response is on its way
+            self.track_request()
         
         # Log processing time
-        process_time = time.time() - start_time
-        logger.debug(f"POST request processed in {process_time:.3f}s")
+        if debug:
+            logger.debug("POST request processed in %.3fs", time.time() - self._now)
     
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS"""
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
+        self.wfile.write(self.response_head(200, None, 0))
+
+def _handle_sigterm(signum, frame):
+    """Turn the supervisor's SIGTERM into a normal shutdown"""
+    raise KeyboardInterrupt
+
+def _handle_sighup(signum, frame):
+    """Drop cached IPs so the next request re-detects the add-on address"""
+    global _CACHED_IP_EXPIRES
+    invalidate_ip_cache()
+    _CACHED_IP_EXPIRES = 0.0
+    logger.info("SIGHUP received, IP cache cleared")
 
 def run_server():
     """Start the HTTP server and MQTT listener"""
     global mqtt_listener
     
+    # Run the shutdown path below on SIGTERM so pending device data is flushed
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    # SIGHUP re-detects the IP (e.g. after the host's address changed)
+    signal.signal(signal.SIGHUP, _handle_sighup)
+    
     server_address = ('0.0.0.0', CONFIG['http_port'])
     
     logger.info("🚀 Sengled Local Server starting up...")
-    logger.info(f"📡 HTTP server listening on port {CONFIG['http_port']}")
-    logger.info(f"🔌 MQTT broker expected on port {CONFIG['mqtt_port']}")
+    logger.info("📡 HTTP server listening on port %d", CONFIG['http_port'])
+    logger.info("🔌 MQTT broker expected on port %d", CONFIG['mqtt_port'])
+    
+    # Request stats and logging run beside the HTTP server
+    start_stats_thread()
     
     # Initial IP detection
     current_ip = get_current_ip()
-    logger.info(f"🌐 Detected IP address: {current_ip}")
+    logger.info("🌐 Detected IP address: %s", current_ip)
     
     # Initialize and start MQTT listener (connect to localhost broker)
     try:
@@ -494,20 +659,22 @@ def run_server():
         mqtt_listener.start()
         logger.info("📡 MQTT listener started for device discovery")
     except Exception as e:
-        logger.error(f"Failed to start MQTT listener: {e}")
+        logger.error("Failed to start MQTT listener: %s", e)
         logger.warning("Device discovery will not be available")
     
     logger.info("✅ Sengled Local Server ready!")
     
-    # Create and start HTTP server
-    httpd = HTTPServer(server_address, SengledHandler)
+    # Create and start HTTP server; each request gets its own daemon thread
+    # so a burst of provisioning bulbs isn't served one at a time
+    httpd = ThreadingHTTPServer(server_address, SengledHandler)
+    httpd.daemon_threads = True
     
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         logger.info("🛑 Sengled Local Server shutting down...")
         uptime = time.time() - STATS['start_time']
-        logger.info(f"📊 Final stats - Uptime: {int(uptime)}s, Total requests: {STATS['total_requests']}")
+        logger.info("📊 Final stats - Uptime: %ds, Total requests: %d", int(uptime), STATS['total_requests'])
     finally:
         # Clean shutdown
         if mqtt_listener: